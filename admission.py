@@ -0,0 +1,251 @@
+"""
+Admission control for the database path of the read routes.
+
+With a cold cache every worker thread can reach MySQL at once, most of them with full-table scans,
+and latency goes up for everyone. getroutes.py therefore opens its sessions through ReadSession below,
+which must obtain a slot before it is created:
+
+    per process    at most ADMISSION_LOCAL_LIMIT sessions at a time. Waiting point lookups are
+                   admitted before waiting scans, and scans may hold at most ADMISSION_SCAN_SHARE
+                   of the slots, so a burst of list requests cannot starve the detail routes.
+    cluster-wide   with ADMISSION_CLUSTER_LIMIT set, at most that many sessions across all processes,
+                   counted in Redis (a sorted set of holders whose entries expire after
+                   ADMISSION_LEASE seconds, so a crashed process cannot leak its slots). The same
+                   scan share applies.
+
+A request that would wait behind ADMISSION_MAX_QUEUE others, or that waits longer than
+ADMISSION_TIMEOUT seconds, raises Rejected; the routes answer 503 with Retry-After. Requests whose
+route has URL parameters (/players/<id>, /players/<id>/achievements) are point lookups, the others
+(/players, /game_events?since=..., /query) are scans. Sessions opened outside a request, e.g. by the
+cache refresher, are not limited. When Redis is unavailable, only the per-process limit applies.
+"""
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+from flask import has_request_context, request
+from sqlalchemy.orm import sessionmaker
+
+from db_routing import RoutingSession
+from db_utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_LOCAL_LIMIT = int(os.getenv("ADMISSION_LOCAL_LIMIT", 15))  # DB sessions per process (the engine's
+                                                                      # pool_size + max_overflow), 0 disables
+ADMISSION_CLUSTER_LIMIT = int(os.getenv("ADMISSION_CLUSTER_LIMIT", 0))  # DB sessions across all processes, 0 disables
+ADMISSION_SCAN_SHARE = float(os.getenv("ADMISSION_SCAN_SHARE", 0.5))  # fraction of the slots scans may hold
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 64))  # requests waiting per process before rejecting
+ADMISSION_TIMEOUT = float(os.getenv("ADMISSION_TIMEOUT", 2))  # seconds a request waits for a slot
+ADMISSION_LEASE = int(os.getenv("ADMISSION_LEASE", 30))  # seconds before a lost cluster slot is reclaimed
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 1))  # seconds, sent with 503 responses
+
+POINT = "point"
+SCAN = "scan"
+KINDS = (POINT, SCAN)
+
+HOLDERS_KEY = "admission:holders"
+SCAN_HOLDERS_KEY = "admission:holders:scan"
+
+# KEYS: all holders, scan holders; ARGV: token, kind, limit, scan limit, lease.
+_ACQUIRE = """
+local now = tonumber(redis.call('TIME')[1])
+local lease = tonumber(ARGV[5])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - lease)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+if ARGV[2] == 'scan' then
+    if redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[4]) then
+        return 0
+    end
+    redis.call('ZADD', KEYS[2], now, ARGV[1])
+    redis.call('EXPIRE', KEYS[2], lease)
+end
+redis.call('ZADD', KEYS[1], now, ARGV[1])
+redis.call('EXPIRE', KEYS[1], lease)
+return 1
+"""
+
+
+class Rejected(Exception):
+    """Raised instead of opening a session when the database is saturated."""
+
+    def __init__(self, kind, reason):
+        super().__init__(f"database busy ({kind} {reason})")
+        self.kind = kind
+        self.reason = reason
+        self.retry_after = ADMISSION_RETRY_AFTER
+
+
+def scan_limit(limit):
+    return max(1, int(limit * ADMISSION_SCAN_SHARE))
+
+
+class LocalLimiter:
+    """Counting semaphore for one process that admits waiting point lookups before waiting scans."""
+
+    def __init__(self, limit, max_queue):
+        self.limit = limit
+        self.scan_limit = scan_limit(limit)
+        self.max_queue = max_queue
+        self.in_flight = dict.fromkeys(KINDS, 0)
+        self.waiting = dict.fromkeys(KINDS, 0)
+        self._condition = threading.Condition()
+
+    def _can_enter(self, kind):
+        if sum(self.in_flight.values()) >= self.limit:
+            return False
+        if kind == SCAN:
+            return self.in_flight[SCAN] < self.scan_limit and not self.waiting[POINT]
+        return True
+
+    def acquire(self, kind, deadline):
+        with self._condition:
+            if self._can_enter(kind):
+                self.in_flight[kind] += 1
+                return
+            if sum(self.waiting.values()) >= self.max_queue:
+                raise Rejected(kind, "queue full")
+            self.waiting[kind] += 1
+            try:
+                while not self._can_enter(kind):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise Rejected(kind, "timeout")
+                    self._condition.wait(remaining)
+                self.in_flight[kind] += 1
+            finally:
+                self.waiting[kind] -= 1
+                self._condition.notify_all()  # a point lookup leaving the queue can unblock scans
+
+    def release(self, kind):
+        with self._condition:
+            self.in_flight[kind] -= 1
+            self._condition.notify_all()
+
+
+class ClusterLimiter:
+    """Counting semaphore shared by every process through Redis; admits everything while Redis is down."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.scan_limit = scan_limit(limit)
+
+    def acquire(self, kind, deadline):
+        """Returns the token to release, or None if Redis could not be asked."""
+        token = uuid.uuid4().hex
+        delay = 0.005
+        while True:
+            admitted = redis_client.eval(_ACQUIRE, 2, HOLDERS_KEY, SCAN_HOLDERS_KEY,
+                                         token, kind, self.limit, self.scan_limit, ADMISSION_LEASE)
+            if admitted is None:
+                return None
+            if admitted:
+                return token
+            if time.monotonic() + delay > deadline:
+                raise Rejected(kind, "timeout")
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, 0.1)
+
+    def release(self, token):
+        pipe = redis_client.pipeline()
+        pipe.zrem(HOLDERS_KEY, token)
+        pipe.zrem(SCAN_HOLDERS_KEY, token)
+        redis_client.execute(pipe)
+
+    def in_flight(self):
+        pipe = redis_client.pipeline()
+        pipe.zcard(HOLDERS_KEY)
+        pipe.zcard(SCAN_HOLDERS_KEY)
+        counts = redis_client.execute(pipe) or [0, 0]
+        return {POINT: counts[0] - counts[1], SCAN: counts[1]}
+
+
+local = LocalLimiter(ADMISSION_LOCAL_LIMIT, ADMISSION_MAX_QUEUE) if ADMISSION_LOCAL_LIMIT > 0 else None
+cluster = ClusterLimiter(ADMISSION_CLUSTER_LIMIT) if ADMISSION_CLUSTER_LIMIT > 0 else None
+
+# Callables invoked as listener(kind, seconds waited, reason) for every admission decision;
+# `reason` is None for admitted sessions and the Rejected reason otherwise.
+listeners = []
+
+
+def _notify(kind, start, reason):
+    for listener in listeners:
+        listener(kind, time.monotonic() - start, reason)
+
+
+def current_kind():
+    """POINT or SCAN for the current request, or None outside a request."""
+    if not has_request_context():
+        return None
+    return POINT if request.view_args else SCAN
+
+
+class Permit:
+    """A slot held by one session; release() is idempotent."""
+
+    def __init__(self, kind, local_held, token):
+        self.kind = kind
+        self.local_held = local_held
+        self.token = token
+
+    def release(self):
+        if self.local_held:
+            self.local_held = False
+            local.release(self.kind)
+        if self.token is not None:
+            token, self.token = self.token, None
+            cluster.release(token)
+
+
+def acquire(kind):
+    """Waits for a slot of `kind`; returns a Permit or raises Rejected."""
+    start = time.monotonic()
+    deadline = start + ADMISSION_TIMEOUT
+    permit = Permit(kind, False, None)
+    try:
+        if local is not None:
+            local.acquire(kind, deadline)
+            permit.local_held = True
+        if cluster is not None:
+            permit.token = cluster.acquire(kind, deadline)
+    except Rejected as e:
+        permit.release()
+        logger.warning(f"Rejected a {kind} request after {time.monotonic() - start:.3f}s: {e.reason}")
+        _notify(kind, start, e.reason)
+        raise
+    _notify(kind, start, None)
+    return permit
+
+
+class AdmittedSession(RoutingSession):
+    """RoutingSession that holds an admission slot from creation until close()."""
+
+    def __init__(self, *args, **kwargs):
+        kind = current_kind()
+        self.permit = acquire(kind) if kind is not None else None
+        super().__init__(*args, **kwargs)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self.permit is not None:
+                self.permit.release()
+
+
+# Drop-in replacement for db_routing.ReadSession in request handlers.
+ReadSession = sessionmaker(class_=AdmittedSession)
+
+
+def stats():
+    """Sessions holding a slot and requests waiting for one, per kind, in this process and cluster-wide."""
+    return {
+        "local": {"in_flight": dict(local.in_flight), "waiting": dict(local.waiting)} if local is not None else None,
+        "cluster": {"in_flight": cluster.in_flight()} if cluster is not None else None,
+    }
@@ -1,13 +1,51 @@
+import threading
+
 from flask import Flask
 
+from approutes.adminroutes import app as admin_routes_app
 from approutes.getroutes import app as get_routes_app
-from db_utils import Base, engine, os
+from approutes.postroutes import app as post_routes_app
+import live_events
+import metrics
+import query_inspector
+import stats_buffer
+import world_snapshot
+from cache_warmup import start_background_tasks
+from db_utils import Base, DATABASE_URL, engine, os
 
 app = Flask(__name__)
 app.register_blueprint(get_routes_app)
-app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql+pymysql://{os.getenv("MYSQL_USER", "root")}:{os.getenv("MYSQL_PASSWORD", "Liberty10")}@{os.getenv("MYSQL_HOST", "mysql")}:{3306}/{os.getenv("MYSQL_DATABASE", "Plague_Rat_Character")}'
+app.register_blueprint(post_routes_app)
+app.register_blueprint(admin_routes_app)
+metrics.init_app(app)
+live_events.init_app(app)
+query_inspector.init_app(app)
+app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+_background_pid = None
+_background_lock = threading.Lock()
+
+
+@app.before_request
+def start_background_threads():
+    """
+    Starts the cache refresher, stats flusher and snapshot refresher in every process that serves
+    requests, under any server (python app.py, flask run, gunicorn). Threads do not survive a fork,
+    so they are started on the first request of each process rather than at import.
+    """
+    global _background_pid
+    if _background_pid == os.getpid():
+        return
+    with _background_lock:
+        if _background_pid == os.getpid():
+            return
+        _background_pid = os.getpid()
+    start_background_tasks()
+    stats_buffer.start_flusher()
+    world_snapshot.start_refresher()
+
+
 @app.route("/")
 def welcome():
     return "<p>Welcome to the Plague Rats API!</p>"
@@ -234,6 +234,7 @@ CREATE TABLE `economy` (
   PRIMARY KEY (`transaction_id`),
   KEY `player_id` (`player_id`),
   KEY `item_id` (`item_id`),
+  KEY `ix_economy_timestamp` (`timestamp`),
   CONSTRAINT `economy_ibfk_1` FOREIGN KEY (`player_id`) REFERENCES `player` (`player_id`) ON DELETE CASCADE,
   CONSTRAINT `economy_ibfk_2` FOREIGN KEY (`item_id`) REFERENCES `item` (`item_id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=13 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -318,6 +319,7 @@ CREATE TABLE `game_event` (
   PRIMARY KEY (`event_id`),
   KEY `player_id` (`player_id`),
   KEY `colony_id` (`colony_id`),
+  KEY `ix_game_event_timestamp` (`timestamp`),
   CONSTRAINT `game_event_ibfk_1` FOREIGN KEY (`player_id`) REFERENCES `player` (`player_id`) ON DELETE SET NULL,
   CONSTRAINT `game_event_ibfk_2` FOREIGN KEY (`colony_id`) REFERENCES `colony` (`colony_id`) ON DELETE SET NULL
 ) ENGINE=InnoDB AUTO_INCREMENT=22 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -410,6 +412,7 @@ CREATE TABLE `plague_affected` (
   `recovery_date` datetime DEFAULT NULL,
   PRIMARY KEY (`relation_id`),
   UNIQUE KEY `entity_type` (`entity_type`,`entity_id`,`plague_id`),
+  KEY `ix_plague_affected_entity_active` (`entity_type`,`entity_id`,`recovery_date`),
   KEY `plague_id` (`plague_id`),
   CONSTRAINT `plague_affected_ibfk_1` FOREIGN KEY (`plague_id`) REFERENCES `plague` (`plague_id`) ON DELETE CASCADE,
   CONSTRAINT `plague_affected_chk_1` CHECK ((`entity_type` in (_utf8mb4'rat',_utf8mb4'player')))
@@ -0,0 +1,74 @@
+import hmac
+import logging
+import os
+
+from flask import jsonify, Blueprint, Response, request, stream_with_context
+
+import cache_tags
+import columnar_export
+import ttl_policy
+from cache_keys import COLLECTIONS, DETAIL_PREFIXES, LIST_KEYS
+
+logger = logging.getLogger(__name__)
+
+app = Blueprint('admin_routes', __name__) # app is a Blueprint
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")  # required in the X-Admin-Token header of every /admin route;
+                                        # the routes are disabled while it is unset
+
+TABLES = {model.__tablename__: model for model in [*LIST_KEYS.values(), *DETAIL_PREFIXES.values(),
+                                                   *(model for model, _, _ in COLLECTIONS.values())]}
+
+
+@app.before_request
+def check_token():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin routes are disabled: ADMIN_TOKEN is not set"}), 403
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        return jsonify({"error": "Forbidden"}), 403
+
+
+@app.route("/admin/cache/invalidate", methods=["POST"])
+def invalidate_cache():
+    """
+    Invalidates cached values by tag and/or by table:
+    {"tags": ["colony:7", "player_achievement:player_id=5"], "tables": ["plague"]}.
+    A tag is a table ("colony"), a row ("colony:7") or a collection ("player_achievement:player_id=5").
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "body must be a JSON object"}), 400
+    tags = body.get('tags', [])
+    tables = body.get('tables', [])
+    if not isinstance(tags, list) or not all(isinstance(tag, str) and tag for tag in tags):
+        return jsonify({"error": "'tags' must be a list of strings"}), 400
+    if not isinstance(tables, list) or not all(table in TABLES for table in tables):
+        return jsonify({"error": f"'tables' must be a list of: {', '.join(sorted(TABLES))}"}), 400
+
+    removed = cache_tags.invalidate(*tags) + cache_tags.invalidate_table(*(TABLES[table] for table in tables))
+    logger.info(f"Invalidated {removed} cache keys for tags {tags} and tables {tables}")
+    return jsonify({"invalidated": removed})
+
+
+@app.route("/admin/cache/ttl", methods=["GET"])
+def cache_ttl_policy():
+    """
+    The TTL every key family currently gets, why, its table's invalidation rate and this process's
+    hit ratio, e.g. {"all_severities": {"ttl": 86400, "reason": "stable", ...}}.
+    """
+    return jsonify(ttl_policy.policy.report())
+
+
+@app.route("/admin/export/<table>", methods=["GET"])
+def export_table(table):
+    """Streams a whole table as Arrow IPC record batches of `batch_size` rows (see columnar_export.py)."""
+    model = columnar_export.MODELS.get(table)
+    if model is None:
+        return jsonify({"error": f"table must be one of: {', '.join(sorted(columnar_export.MODELS))}"}), 404
+    batch_size = request.args.get("batch_size", columnar_export.EXPORT_BATCH_SIZE, type=int)
+    if batch_size < 1:
+        return jsonify({"error": "batch_size must be positive"}), 400
+    logger.info(f"Exporting {table} in batches of {batch_size}")
+    return Response(stream_with_context(columnar_export.ipc_stream(model, batch_size)),
+                    mimetype="application/vnd.apache.arrow.stream",
+                    headers={"Content-Disposition": f"attachment; filename={table}.arrows"})
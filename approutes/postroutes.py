@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+from datetime import datetime
+
+from flask import jsonify, Blueprint, request
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+import battle_engine
+import cache_tags
+import live_events
+import stats_buffer
+from db_routing import WriteSession
+from models import Colony, Economy, GameEvent, Item, Player
+
+logger = logging.getLogger(__name__)
+
+app = Blueprint('post_routes', __name__) # app is a Blueprint
+
+INGEST_MAX_ROWS = int(os.getenv("INGEST_MAX_ROWS", 10000))  # rows accepted per request
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 1000))  # rows per multi-row INSERT and transaction
+
+
+class RowError(ValueError):
+    pass
+
+
+def _string(row, field, max_length, required=False):
+    value = row.get(field)
+    if value is None:
+        if required:
+            raise RowError(f"'{field}' is required")
+        return None
+    if not isinstance(value, str) or not value.strip():
+        raise RowError(f"'{field}' must be a non-empty string")
+    if len(value) > max_length:
+        raise RowError(f"'{field}' must be at most {max_length} characters")
+    return value
+
+
+def _integer(row, field, required=False, default=None):
+    value = row.get(field)
+    if value is None:  # missing or null
+        value = default
+    if value is None:
+        if required:
+            raise RowError(f"'{field}' is required")
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise RowError(f"'{field}' must be an integer")
+    return value
+
+
+def _timestamp(row, field):
+    value = row.get(field)
+    if value is None:
+        return datetime.now()  # mirrors the column's server_default of NOW()
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise RowError(f"'{field}' must be an ISO 8601 datetime")
+
+
+def _game_event(row):
+    return {
+        'event_type': _string(row, 'event_type', 100, required=True),
+        'description': _string(row, 'description', 65535),
+        'timestamp': _timestamp(row, 'timestamp'),
+        'player_id': _integer(row, 'player_id'),
+        'colony_id': _integer(row, 'colony_id'),
+    }
+
+
+def _economy(row):
+    amount = _integer(row, 'amount', default=1)
+    if amount < 1:
+        raise RowError("'amount' must be at least 1")
+    return {
+        'player_id': _integer(row, 'player_id', required=True),
+        'item_id': _integer(row, 'item_id', required=True),
+        'transaction_type': _string(row, 'transaction_type', 50, required=True),
+        'amount': amount,
+        'timestamp': _timestamp(row, 'timestamp'),
+    }
+
+
+def read_batch():
+    """Returns the request body as a list of dicts: a JSON array, or one JSON object per line for NDJSON."""
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        rows = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), 1):
+            if line.strip():
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    raise RowError(f"line {number} is not valid JSON")
+        return rows
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        raise RowError("body must be a JSON array or NDJSON")
+    return rows
+
+
+def validate(rows, convert, references):
+    """
+    Converts every row with `convert` and checks that the IDs it references exist, using one
+    IN query per referenced table. Returns (rows, errors) where errors lists {"index", "error"}.
+    """
+    valid, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise RowError("row must be a JSON object")
+            valid.append((index, convert(row)))
+        except RowError as e:
+            errors.append({"index": index, "error": str(e)})
+
+    session = WriteSession()
+    try:
+        for field, column in references.items():
+            wanted = {row[field] for _, row in valid if row[field] is not None}
+            if not wanted:
+                continue
+            found = set(session.execute(select(column).where(column.in_(wanted))).scalars())
+            for index, row in valid:
+                if row[field] is not None and row[field] not in found:
+                    errors.append({"index": index, "error": f"'{field}' {row[field]} does not exist"})
+    finally:
+        session.close()
+    return [row for _, row in valid], sorted(errors, key=lambda error: error["index"])
+
+
+def ingest(model, convert, references):
+    """
+    Validates the batch, inserts it in chunked multi-row INSERTs, publishes each committed chunk to
+    live subscribers and invalidates the cached values built from `model` once.
+    """
+    try:
+        rows = read_batch()
+    except RowError as e:
+        return jsonify({"error": str(e)}), 400
+    if len(rows) > INGEST_MAX_ROWS:
+        return jsonify({"error": f"At most {INGEST_MAX_ROWS} rows per batch"}), 413
+
+    try:
+        rows, errors = validate(rows, convert, references)
+    except SQLAlchemyError as e:
+        logger.error(f"Error validating {model.__tablename__} batch: {e}")
+        return jsonify({"error": str(e)}), 500
+    if errors:
+        return jsonify({"error": "Invalid rows, nothing was inserted", "rows": errors}), 422
+
+    inserted = 0
+    session = WriteSession()
+    try:
+        for start in range(0, len(rows), INGEST_CHUNK_SIZE):
+            chunk = rows[start:start + INGEST_CHUNK_SIZE]
+            with session.begin():
+                session.execute(insert(model.__table__), chunk)
+            inserted += len(chunk)
+            live_events.publish_rows(model, chunk)
+    except SQLAlchemyError as e:
+        logger.error(f"Error inserting {model.__tablename__} batch after {inserted} rows: {e}")
+        return jsonify({"error": str(e), "inserted": inserted}), 500
+    finally:
+        session.close()
+        if inserted:
+            cache_tags.invalidate_rows(model, rows[:inserted])
+
+    return jsonify({"inserted": inserted}), 201
+
+
+@app.route("/game_events:batch", methods=["POST"])
+def post_game_events_batch():
+    """Inserts a batch of game events (JSON array or NDJSON) and invalidates the cached event list."""
+    return ingest(GameEvent, _game_event,
+                  {'player_id': Player.player_id, 'colony_id': Colony.colony_id})
+
+
+@app.route("/economy:batch", methods=["POST"])
+def post_economy_batch():
+    """Inserts a batch of economy transactions (JSON array or NDJSON) and invalidates the cached list."""
+    return ingest(Economy, _economy,
+                  {'player_id': Player.player_id, 'item_id': Item.item_id})
+
+
+@app.route("/stats/<int:player_id>", methods=["PATCH"])
+def patch_stats(player_id):
+    """
+    Updates a player's stats through the write-behind buffer. The body sets stats directly
+    ({"HP": 80, "x_coordinate": "12.5"}) and/or adjusts integer stats under "increment"
+    ({"increment": {"XP": 25, "HP": -5}}). Returns the player's new stats.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "body must be a JSON object"}), 400
+    values = {field: value for field, value in body.items() if field != 'increment'}
+    increments = body.get('increment') or {}
+    if not isinstance(increments, dict):
+        return jsonify({"error": "'increment' must be a JSON object"}), 400
+    try:
+        stats = stats_buffer.update(player_id, values, increments)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except SQLAlchemyError as e:
+        logger.error(f"Error updating stats for player {player_id}: {e}")
+        return jsonify({"error": str(e)}), 500
+    if stats is None:
+        return jsonify({"error": "Player not found"}), 404
+    return jsonify(stats)
+
+
+@app.route("/battles:resolve", methods=["POST"])
+def post_battles_resolve():
+    """
+    Resolves pending battles in one batch: all of them up to "limit", or only those in "battle_ids".
+    Returns the winner of every battle that was resolved.
+    """
+    body = request.get_json(silent=True) or {}
+    battle_ids = body.get('battle_ids')
+    limit = body.get('limit', battle_engine.BATTLE_BATCH_SIZE)
+    if battle_ids is not None and (not isinstance(battle_ids, list)
+                                   or not all(isinstance(battle_id, int) for battle_id in battle_ids)):
+        return jsonify({"error": "'battle_ids' must be a list of integers"}), 400
+    if isinstance(limit, bool) or not isinstance(limit, int) or not 0 < limit <= battle_engine.BATTLE_BATCH_SIZE:
+        return jsonify({"error": f"'limit' must be an integer from 1 to {battle_engine.BATTLE_BATCH_SIZE}"}), 400
+    try:
+        winners = battle_engine.resolve(battle_ids, limit)
+    except SQLAlchemyError as e:
+        logger.error(f"Error resolving battles: {e}")
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"resolved": len(winners),
+                    "battles": [{"battle_id": battle_id, "winner_colony_id": winner}
+                                for battle_id, winner in winners.items()]})
@@ -0,0 +1,114 @@
+"""
+Hot/cold tiering for the append-only history tables, game_event and economy.
+
+archive() moves rows older than ARCHIVE_RETENTION_DAYS from the online table into its archive table
+(game_event_archive, economy_archive) in chunks of ARCHIVE_BATCH_SIZE. Each chunk is one transaction
+that copies the rows and deletes them, so a row is always in exactly one tier and an interrupted
+run simply continues where it stopped. The online tables, their indexes and the cached lists stay
+the size of the retention window.
+
+Reads keep working on the existing routes:
+    GET /game_events                                   the online window, cached as before
+    GET /game_events?since=2024-01-01&until=2024-02-01 a time range from both tiers, oldest first
+    GET /game_events/<id>                              falls back to the archive for archived IDs
+The archive is only queried when a range starts before the oldest online row.
+
+Usage:
+    python archive.py [table ...] [--days N]          # e.g. daily from cron
+"""
+import argparse
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import delete, func, insert, select
+
+import cache_keys
+import cache_tags
+from db_routing import WriteSession
+from models import Economy, EconomyArchive, GameEvent, GameEventArchive
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", 90))  # days of history kept online
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 5000))  # rows moved per transaction
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 1000))  # default rows per ranged read
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", 10000))
+
+# Online model -> archive model.
+TIERS = {GameEvent: GameEventArchive, Economy: EconomyArchive}
+TABLES = {model.__tablename__: model for model in TIERS}
+
+
+def archive(model, days=ARCHIVE_RETENTION_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Moves the rows of `model` older than `days` to its archive table and returns how many moved."""
+    hot, cold = model.__table__, TIERS[model].__table__
+    pk = cache_keys.primary_key_columns(model)[0]
+    columns = [column.name for column in hot.columns]
+    cutoff = datetime.now() - timedelta(days=days)
+    moved = 0
+    while True:
+        session = WriteSession()
+        try:
+            with session.begin():
+                ids = session.execute(select(pk).where(hot.c.timestamp < cutoff).order_by(pk).limit(batch_size)
+                                      .with_for_update(skip_locked=True)).scalars().all()
+                if ids:
+                    session.execute(insert(cold).from_select(columns, select(*hot.c).where(pk.in_(ids))))
+                    session.execute(delete(hot).where(pk.in_(ids)))
+        finally:
+            session.close()
+        if not ids:
+            break
+        moved += len(ids)
+        logger.debug(f"Archived {moved} {model.__tablename__} rows so far")
+
+    if moved:
+        # Archived rows keep their content, so only the cached lists of the online window change.
+        cache_tags.invalidate(model.__tablename__)
+        logger.info(f"Archived {moved} {model.__tablename__} rows older than {cutoff}")
+    return moved
+
+
+def find(session, model, pk):
+    """The archived row of `model` with primary key `pk`, or None."""
+    return session.get(TIERS[model], pk)
+
+
+def _range(session, model, since, until, limit):
+    pk = getattr(model, cache_keys.primary_key_columns(model)[0].key)
+    query = session.query(model)
+    if since is not None:
+        query = query.filter(model.timestamp >= since)
+    if until is not None:
+        query = query.filter(model.timestamp < until)
+    return query.order_by(model.timestamp, pk).limit(limit).all()
+
+
+def history(session, model, since=None, until=None, limit=HISTORY_PAGE_SIZE):
+    """
+    Serialized rows of `model` with since <= timestamp < until from both tiers, oldest first, at most
+    `limit` of them.
+    """
+    rows = _range(session, model, since, until, limit)
+    oldest_online = session.execute(select(func.min(model.timestamp))).scalar()
+    if since is None or oldest_online is None or since < oldest_online:
+        archived = _range(session, TIERS[model], since, until, limit)
+        pk = cache_keys.primary_key_columns(model)[0].name
+        rows = islice(heapq.merge(archived, rows, key=lambda row: (row.timestamp, getattr(row, pk))), limit)
+    return [row.serialize() for row in rows]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Move old game_event and economy rows to their archive tables.")
+    parser.add_argument("tables", nargs="*", help=f"default: {' '.join(TABLES)}")
+    parser.add_argument("--days", type=int, default=ARCHIVE_RETENTION_DAYS)
+    args = parser.parse_args()
+    unknown = [table for table in args.tables if table not in TABLES]
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(unknown)}")
+    for table in args.tables or TABLES:
+        print(f"{table}: {archive(TABLES[table], days=args.days)}")
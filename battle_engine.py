@@ -0,0 +1,135 @@
+"""
+Resolves pending battles (winner_colony_id IS NULL) in batches.
+
+A call loads the pending battles, their participants and the rat strength of every involved colony
+with three set-based queries. It scores all participants with NumPy and writes every winner plus one
+"Battle won"/"Battle lost" GameEvent per participant in a single transaction. The run's cost
+depends on the number of battles, not on round trips per battle.
+
+Scoring: a participant's power is num_units x the mean strength x the mean health of its colony's
+plague rats, multiplied by log-normal luck (sigma BATTLE_LUCK). The highest power wins. A colony
+without rats fights with the PlagueRat column defaults. A battle with a single participant is won
+uncontested. A battle without participants stays pending but is skipped, so it never takes a slot
+in a batch.
+
+Usage:
+    python battle_engine.py                # resolve up to BATTLE_BATCH_SIZE pending battles
+"""
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import and_, bindparam, exists, func, insert, select, update
+
+import cache_tags
+import live_events
+from db_routing import WriteSession
+from models import Battle, BattleParticipant, GameEvent, PlagueRat
+
+logger = logging.getLogger(__name__)
+
+BATTLE_BATCH_SIZE = int(os.getenv("BATTLE_BATCH_SIZE", 1000))  # pending battles resolved per call
+BATTLE_LUCK = float(os.getenv("BATTLE_LUCK", 0.25))  # sigma of the log-normal luck factor, 0 is deterministic
+
+DEFAULT_STRENGTH = PlagueRat.__table__.c.strength.default.arg
+DEFAULT_HEALTH = PlagueRat.__table__.c.health.default.arg
+
+
+def load(session, battle_ids=None, limit=BATTLE_BATCH_SIZE):
+    """
+    Returns (battle_ids, participants, colony_power) for up to `limit` pending battles. Participants is
+    a list of (battle_id, colony_id, num_units) rows and colony_power maps colony_id to
+    mean strength x mean health of its rats.
+    """
+    has_participants = exists(select(BattleParticipant.battle_id)
+                              .where(BattleParticipant.battle_id == Battle.battle_id))
+    pending = (select(Battle.battle_id).where(Battle.winner_colony_id.is_(None), has_participants)
+               .order_by(Battle.battle_id))
+    if battle_ids is not None:
+        pending = pending.where(Battle.battle_id.in_(battle_ids))
+    # SKIP LOCKED lets concurrent runs (MySQL 8+) take disjoint batches instead of waiting on each other.
+    battles = session.execute(pending.limit(limit).with_for_update(skip_locked=True)).scalars().all()
+    if not battles:
+        return [], [], {}
+
+    participants = session.execute(
+        select(BattleParticipant.battle_id, BattleParticipant.colony_id, BattleParticipant.num_units)
+        .where(BattleParticipant.battle_id.in_(battles))).all()
+    colonies = {row.colony_id for row in participants}
+    rats = session.execute(
+        select(PlagueRat.colony_id, func.avg(PlagueRat.strength), func.avg(PlagueRat.health))
+        .where(PlagueRat.colony_id.in_(colonies))
+        .group_by(PlagueRat.colony_id)).all() if colonies else []
+    colony_power = {colony_id: float(strength or DEFAULT_STRENGTH) * float(health or DEFAULT_HEALTH)
+                    for colony_id, strength, health in rats}
+    return battles, participants, colony_power
+
+
+def score(participants, colony_power, rng):
+    """Returns {battle_id: winning colony_id} for the given participant rows, using array math."""
+    if not participants:
+        return {}
+    battle = np.array([row[0] for row in participants], dtype=np.int64)
+    colony = np.array([row[1] for row in participants], dtype=np.int64)
+    units = np.array([row[2] or 0 for row in participants], dtype=np.float64)
+    default = DEFAULT_STRENGTH * DEFAULT_HEALTH
+    power = units * np.array([colony_power.get(colony_id, default) for colony_id in colony.tolist()])
+    if BATTLE_LUCK > 0:
+        power *= rng.lognormal(0.0, BATTLE_LUCK, len(power))
+
+    # Sort by battle, strongest first; the first row of each battle is its winner.
+    order = np.lexsort((-power, battle))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = battle[order][1:] != battle[order][:-1]
+    winners = order[first]
+    return dict(zip(battle[winners].tolist(), colony[winners].tolist()))
+
+
+def resolve(battle_ids=None, limit=BATTLE_BATCH_SIZE, seed=None):
+    """Resolves up to `limit` pending battles (optionally only `battle_ids`) and returns {battle_id: winner}."""
+    rng = np.random.default_rng(seed)
+    session = WriteSession()
+    try:
+        with session.begin():
+            battles, participants, colony_power = load(session, battle_ids, limit)
+            winners = score(participants, colony_power, rng)
+            if not winners:
+                return {}
+
+            # Guarded by winner_colony_id IS NULL in case the battle was resolved by other code meanwhile.
+            table = Battle.__table__
+            session.connection().execute(
+                update(table)
+                .where(and_(table.c.battle_id == bindparam("b_battle_id"), table.c.winner_colony_id.is_(None)))
+                .values(winner_colony_id=bindparam("winner_colony_id")),
+                [{"b_battle_id": battle_id, "winner_colony_id": winner} for battle_id, winner in winners.items()])
+
+            now = datetime.now()
+            events = []
+            for battle_id, colony_id, _ in participants:
+                if battle_id in winners:
+                    outcome = "won" if winners[battle_id] == colony_id else "lost"
+                    events.append({"event_type": f"Battle {outcome}", "timestamp": now, "player_id": None,
+                                   "description": f"Colony {colony_id} {outcome} battle {battle_id}.",
+                                   "colony_id": colony_id})
+            session.execute(insert(GameEvent.__table__), events)
+    finally:
+        session.close()
+
+    cache_tags.invalidate_rows(Battle, [{"battle_id": battle_id} for battle_id in winners])
+    cache_tags.invalidate_table(GameEvent)
+    colonies = {}
+    for battle_id, colony_id, _ in participants:
+        colonies.setdefault(battle_id, []).append(colony_id)
+    live_events.publish_rows(Battle, [{"battle_id": battle_id, "winner_colony_id": winner}
+                                      for battle_id, winner in winners.items()],
+                             [(colonies[battle_id], []) for battle_id in winners])
+    live_events.publish_rows(GameEvent, events)
+    logger.info(f"Resolved {len(winners)} of {len(battles)} pending battles")
+    return winners
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"resolved: {len(resolve())}")
@@ -0,0 +1,310 @@
+"""
+Fills every table in models.py with synthetic rows whose foreign keys all point at existing rows.
+
+Usage (from the repository root):
+    DATABASE_URL=sqlite:///benchmarks/bench.db python -m benchmarks.datagen --reset --scale 1
+    python -m benchmarks.datagen --rows economy=5000000 --rows game_event=5000000
+
+Reference tables (severities, weather, ...) have a fixed size; every other table is sized by
+BASE_ROWS times --scale, and --rows overrides single tables. Rows are inserted with multi-row
+executemany batches, so millions of rows take minutes rather than hours.
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from db_utils import Base
+from models import Achievement, Battle, BattleParticipant, Colony, ColonyProgress, ColonyRat, DayNightTime, Economy, \
+    EffectType, Equipment, GameEvent, Item, Plague, PlagueAffected, PlagueRat, Player, PlayerAchievement, \
+    PlayerEquipment, Severity, Stats, Weather, WeatherEffects, engine
+
+SEVERITIES = ["Low", "Medium", "High", "Critical"]
+EFFECT_TYPES = ["Debuff", "Buff", "DOT"]
+WEATHER = [("Clear Skies", "Sunny"), ("Heavy Rain", "Rainy"), ("Dense Fog", "Foggy"),
+           ("Blizzard", "Snowy"), ("Heat Wave", "Scorching")]
+DAY_NIGHT = [("Dawn", 5, 7), ("Day", 7, 18), ("Dusk", 18, 20), ("Night", 20, 5)]
+SPECIES = ["Brown Rat", "Black Rat", "Sewer Rat", "Plague Rat", "Giant Rat"]
+MUTATIONS = [None, "Agile", "Strong", "Resilient", "Venomous"]
+ROLES = ["resident", "scout", "worker", "defender", "breeder"]
+COLONY_STATUSES = ["developing", "expanding", "thriving", "declining"]
+UPGRADES = ["Wall", "Market", "Farm", "Barracks", "Granary"]
+ITEM_TYPES = ["Resource", "Consumable", "Material", "Treasure"]
+EQUIPMENT_TYPES = ["Melee", "Ranged", "Defense", "Trinket"]
+SLOTS = ["hand", "offhand", "head", "body", "feet"]
+BATTLE_TYPES = ["Raid", "Defense", "Skirmish", "Siege"]
+TRANSACTION_TYPES = ["buy", "sell", "trade", "loot"]
+EVENT_TYPES = ["Plague outbreak", "Trade caravan arrival", "Player leveled up", "Colony upgraded", "Battle won"]
+
+# Rows per table at --scale 1; reference tables above are not scaled.
+BASE_ROWS = {
+    "player": 10_000,
+    "colony": 1_000,
+    "plague": 50,
+    "item": 500,
+    "equipment": 300,
+    "achievements": 100,
+    "plague_rat": 50_000,
+    "colony_rat": 50_000,
+    "colony_progress": 5_000,
+    "battle": 5_000,
+    "battle_participant": 15_000,
+    "plague_affected": 20_000,
+    "player_achievements": 30_000,
+    "player_equipment": 20_000,
+    "economy": 200_000,
+    "game_event": 200_000,
+}
+
+BATCH_SIZE = 5_000
+WORLD_SIZE = 1_000.0  # coordinates are drawn from [0, WORLD_SIZE)
+HISTORY_DAYS = 365
+GRID_STRIDE = 2_654_435_761  # prime, see Generator.scatter()
+
+
+class Generator:
+    def __init__(self, sizes, seed):
+        self.sizes = sizes
+        self.rng = random.Random(seed)
+        self.now = datetime.utcnow().replace(microsecond=0)
+
+    def count(self, table):
+        return self.sizes[table]
+
+    def skewed_id(self, table):
+        """An ID in 1..count(table), skewed towards low IDs the way activity concentrates on a few players."""
+        return int(self.count(table) * self.rng.random() ** 2) + 1
+
+    def uniform_id(self, table):
+        return self.rng.randint(1, self.count(table))
+
+    def past(self, days=HISTORY_DAYS):
+        return self.now - timedelta(seconds=self.rng.randint(0, days * 86_400))
+
+    @staticmethod
+    def scatter(cell, size):
+        """Maps 0..size-1 onto itself in a scattered order, so a partial grid walk still covers every row and column."""
+        stride = GRID_STRIDE if math.gcd(GRID_STRIDE, size) == 1 else 1
+        return cell * stride % size
+
+    def coordinate(self):
+        return round(self.rng.uniform(0, WORLD_SIZE), 6)
+
+    # Each method below yields the rows of one table, in foreign-key dependency order.
+
+    def severity(self):
+        for i, name in enumerate(SEVERITIES, 1):
+            yield {"severity_id": i, "severity_name": name}
+
+    def effect_type(self):
+        for i, name in enumerate(EFFECT_TYPES, 1):
+            yield {"effect_type_id": i, "effect_type_name": name}
+
+    def weather_effects(self):
+        for i, (name, _) in enumerate(WEATHER, 1):
+            yield {"effect_id": i, "effect_name": name, "effect_description": f"{name} across the world."}
+
+    def weather(self):
+        for i, (_, name) in enumerate(WEATHER, 1):
+            yield {"weather_id": i, "weather_name": name, "effect_id": i}
+
+    def day_night_time(self):
+        today = self.now.replace(hour=0, minute=0, second=0)
+        for i, (period, start, end) in enumerate(DAY_NIGHT, 1):
+            yield {"time_id": i, "day_night_period": period, "start_time": today + timedelta(hours=start),
+                   "end_time": today + timedelta(hours=end), "effect": f"{period} effect"}
+
+    def item(self):
+        for i in range(1, self.count("item") + 1):
+            yield {"item_id": i, "item_name": f"Item {i}", "item_type": self.rng.choice(ITEM_TYPES)}
+
+    def equipment(self):
+        for i in range(1, self.count("equipment") + 1):
+            yield {"equipment_id": i, "equipment_name": f"Equipment {i}",
+                   "equipment_type": self.rng.choice(EQUIPMENT_TYPES), "description": f"Synthetic equipment {i}."}
+
+    def achievements(self):
+        for i in range(1, self.count("achievements") + 1):
+            yield {"achievement_id": i, "achievement_name": f"Achievement {i}",
+                   "achievement_description": f"Synthetic achievement {i}.", "created_at": self.past(),
+                   "updated_at": self.now}
+
+    def player(self):
+        # current_colony_id is filled in by link_players_to_colonies() once colonies exist.
+        for i in range(1, self.count("player") + 1):
+            joined = self.past()
+            yield {"player_id": i, "username": f"player{i}", "email": f"player{i}@example.com",
+                   "password_hash": "placeholder_hash", "join_date": joined,
+                   "last_login": joined + timedelta(seconds=self.rng.randint(0, int((self.now - joined).total_seconds())))}
+
+    def colony(self):
+        for i in range(1, self.count("colony") + 1):
+            yield {"colony_id": i, "leader_id": self.uniform_id("player"), "colony_name": f"Colony {i}",
+                   "colony_size": self.rng.randint(1, 100), "x_coordinate": self.coordinate(),
+                   "y_coordinate": self.coordinate(), "created_at": self.past(),
+                   "status": self.rng.choice(COLONY_STATUSES)}
+
+    def stats(self):
+        for i in range(1, self.count("player") + 1):
+            yield {"player_id": i, "HP": self.rng.randint(1, 100), "MP": self.rng.randint(0, 50),
+                   "AP": self.rng.randint(0, 10), "XP": self.rng.randint(0, 100_000), "SP": self.rng.randint(0, 100),
+                   "x_coordinate": self.coordinate(), "y_coordinate": self.coordinate()}
+
+    def plague(self):
+        for i in range(1, self.count("plague") + 1):
+            yield {"plague_id": i, "plague_name": f"Plague {i}", "description": f"Synthetic plague {i}.",
+                   "effect_type_id": self.rng.randint(1, len(EFFECT_TYPES)),
+                   "severity_id": self.rng.randint(1, len(SEVERITIES)), "duration": self.rng.randint(1, 30),
+                   "spread_rate": self.rng.randint(1, 10), "created_at": self.past()}
+
+    def plague_rat(self):
+        for i in range(1, self.count("plague_rat") + 1):
+            yield {"rat_id": i, "species": self.rng.choice(SPECIES), "health": self.rng.randint(1, 20),
+                   "strength": self.rng.randint(1, 15), "colony_id": (i - 1) % self.count("colony") + 1,
+                   "evolution_stage": self.rng.randint(0, 5), "mutation_type": self.rng.choice(MUTATIONS),
+                   "plague_id": self.uniform_id("plague") if self.rng.random() < 0.3 else None}
+
+    def colony_rat(self):
+        # One membership per rat, matching plague_rat.colony_id, so (colony_id, rat_id) stays unique.
+        for i in range(1, min(self.count("colony_rat"), self.count("plague_rat")) + 1):
+            yield {"colony_id": (i - 1) % self.count("colony") + 1, "rat_id": i,
+                   "role": self.rng.choice(ROLES), "joined_at": self.past()}
+
+    def colony_progress(self):
+        for i in range(1, self.count("colony_progress") + 1):
+            yield {"progress_id": i, "colony_id": self.uniform_id("colony"), "upgrade_type": self.rng.choice(UPGRADES),
+                   "upgrade_level": self.rng.randint(1, 5), "timestamp": self.past()}
+
+    def battle(self):
+        for i in range(1, self.count("battle") + 1):
+            yield {"battle_id": i, "battle_type": self.rng.choice(BATTLE_TYPES),
+                   "winner_colony_id": self.uniform_id("colony") if self.rng.random() < 0.8 else None,
+                   "battle_date": self.past()}
+
+    def battle_participant(self):
+        for i in range(1, self.count("battle_participant") + 1):
+            yield {"participant_id": i, "battle_id": (i - 1) % self.count("battle") + 1,
+                   "colony_id": self.uniform_id("colony"), "num_units": self.rng.randint(1, 50)}
+
+    def plague_affected(self):
+        # Walk one (entity, plague) grid per entity type so (entity_type, entity_id, plague_id) stays unique.
+        plagues = self.count("plague")
+        grids = {"rat": [self.count("plague_rat"), 0], "player": [self.count("player"), 0]}  # [entities, next cell]
+        for i in range(1, self.count("plague_affected") + 1):
+            open_types = [entity_type for entity_type, (entities, cell) in grids.items() if cell < entities * plagues]
+            if not open_types:
+                break
+            entity_type = "rat" if "rat" in open_types and (len(open_types) == 1 or self.rng.random() < 0.7) \
+                else "player"
+            entities, cell = grids[entity_type]
+            grids[entity_type][1] += 1
+            cell = self.scatter(cell, entities * plagues)
+            infected = self.past()
+            yield {"relation_id": i, "entity_type": entity_type, "entity_id": cell % entities + 1,
+                   "plague_id": cell // entities + 1, "infection_date": infected,
+                   "recovery_date": infected + timedelta(days=self.rng.randint(1, 30))
+                   if self.rng.random() < 0.6 else None}
+
+    def player_achievements(self):
+        # Walk the (player, achievement) grid so the unique constraint always holds.
+        players = self.count("player")
+        limit = min(self.count("player_achievements"), players * self.count("achievements"))
+        for i in range(limit):
+            yield {"player_achievement_id": i + 1, "player_id": i % players + 1,
+                   "achievement_id": i // players + 1, "granted_at": self.past()}
+
+    def player_equipment(self):
+        players, slots = self.count("player"), len(SLOTS)
+        limit = min(self.count("player_equipment"), players * slots)
+        for i in range(limit):
+            yield {"player_equipment_id": i + 1, "player_id": i % players + 1,
+                   "equipment_id": self.uniform_id("equipment"), "equipped_slot": SLOTS[i // players]}
+
+    def economy(self):
+        for i in range(1, self.count("economy") + 1):
+            yield {"transaction_id": i, "player_id": self.skewed_id("player"), "item_id": self.skewed_id("item"),
+                   "transaction_type": self.rng.choice(TRANSACTION_TYPES), "amount": self.rng.randint(1, 20),
+                   "timestamp": self.past()}
+
+    def game_event(self):
+        for i in range(1, self.count("game_event") + 1):
+            event_type = self.rng.choice(EVENT_TYPES)
+            yield {"event_id": i, "event_type": event_type, "description": f"{event_type} (synthetic).",
+                   "timestamp": self.past(),
+                   "player_id": self.skewed_id("player") if self.rng.random() < 0.7 else None,
+                   "colony_id": self.uniform_id("colony")}
+
+
+# Insertion order that satisfies every foreign key (player.current_colony_id is linked afterwards).
+TABLES = [
+    (Severity, "severity"), (EffectType, "effect_type"), (WeatherEffects, "weather_effects"), (Weather, "weather"),
+    (DayNightTime, "day_night_time"), (Item, "item"), (Equipment, "equipment"), (Achievement, "achievements"),
+    (Player, "player"), (Colony, "colony"), (Stats, "stats"), (Plague, "plague"), (PlagueRat, "plague_rat"),
+    (ColonyRat, "colony_rat"), (ColonyProgress, "colony_progress"), (Battle, "battle"),
+    (BattleParticipant, "battle_participant"), (PlagueAffected, "plague_affected"),
+    (PlayerAchievement, "player_achievements"), (PlayerEquipment, "player_equipment"), (Economy, "economy"),
+    (GameEvent, "game_event"),
+]
+
+
+def insert_rows(model, rows):
+    """Inserts `rows` with executemany batches of BATCH_SIZE, one transaction per batch."""
+    inserted = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            with engine.begin() as conn:
+                conn.execute(model.__table__.insert(), batch)
+            inserted += len(batch)
+            batch = []
+    if batch:
+        with engine.begin() as conn:
+            conn.execute(model.__table__.insert(), batch)
+        inserted += len(batch)
+    return inserted
+
+
+def link_players_to_colonies(colonies):
+    with engine.begin() as conn:
+        conn.execute(update(Player).values(current_colony_id=(Player.player_id - 1) % colonies + 1))
+
+
+def generate(sizes, seed=42, reset=False):
+    if reset:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    generator = Generator(sizes, seed)
+    for model, table in TABLES:
+        start = time.perf_counter()
+        inserted = insert_rows(model, getattr(generator, table)())
+        elapsed = time.perf_counter() - start
+        print(f"{table:<22} {inserted:>10} rows  {elapsed:7.1f}s  {inserted / max(elapsed, 1e-9):>10.0f} rows/s")
+    link_players_to_colonies(sizes["colony"])
+
+
+def parse_sizes(scale, overrides):
+    sizes = {table: max(1, int(rows * scale)) for table, rows in BASE_ROWS.items()}
+    for override in overrides:
+        table, _, rows = override.partition("=")
+        if table not in sizes:
+            raise SystemExit(f"Unknown table {table!r}; sizable tables: {', '.join(sizes)}")
+        sizes[table] = int(rows)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier applied to BASE_ROWS")
+    parser.add_argument("--rows", action="append", default=[], metavar="TABLE=N", help="exact size for one table")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args()
+    generate(parse_sizes(args.scale, args.rows), seed=args.seed, reset=args.reset)
+
+
+if __name__ == "__main__":
+    main()
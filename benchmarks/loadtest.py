@@ -0,0 +1,192 @@
+"""
+Replays a weighted mix of GET requests against the API, first with a cold cache and then with a
+warm one, and reports throughput and p50/p95/p99 latency per phase and per route.
+
+Usage (from the repository root, after benchmarks.datagen):
+    DATABASE_URL=sqlite:///benchmarks/bench.db python -m benchmarks.loadtest --fakeredis
+    python -m benchmarks.loadtest --url http://localhost:5000 --requests 20000 --concurrency 32
+
+Without --url the Flask app is driven in-process through its test client. --fakeredis swaps the
+app's Redis connection for an in-memory fakeredis server (in-process mode only). Against a real
+Redis, the cold phase only drops the cached key families; stats buffers, existence filters and
+other state in the same database are left alone.
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select
+
+import cache_tags
+from cache_keys import COLLECTIONS, DETAIL_PREFIXES, LIST_KEYS
+from db_utils import redis_client
+from models import Colony, Economy, GameEvent, Item, Plague, PlagueAffected, PlagueRat, Player, Stats, engine
+
+# (weight, path template, model whose max ID bounds {id}); mostly point lookups, some list scans.
+WORKLOAD = [
+    (20, "/players/{id}", Player),
+    (15, "/stats/{id}", Stats),
+    (15, "/colonies/{id}", Colony),
+    (10, "/plague_rats/{id}", PlagueRat),
+    (8, "/players/{id}/achievements", Player),
+    (5, "/game_events/{id}", GameEvent),
+    (5, "/economy/{id}", Economy),
+    (5, "/plague_affected/{id}", PlagueAffected),
+    (4, "/items/{id}", Item),
+    (3, "/plagues/{id}", Plague),
+    (2, "/severities", None),
+    (2, "/effect_types", None),
+    (2, "/weather", None),
+    (1, "/items", None),
+    (1, "/plagues", None),
+    (1, "/colonies", None),
+    (1, "/players", None),
+]
+
+
+def max_ids():
+    with engine.connect() as conn:
+        bounds = {}
+        for _, _, model in WORKLOAD:
+            if model is not None and model not in bounds:
+                pk = list(model.__table__.primary_key.columns)[0]
+                bounds[model] = conn.execute(select(func.max(pk))).scalar() or 1
+        return bounds
+
+
+def build_plan(total, seed):
+    """Returns `total` (route, path) pairs drawn from WORKLOAD; IDs are skewed towards hot, low values."""
+    rng = random.Random(seed)
+    bounds = max_ids()
+    weights = [weight for weight, _, _ in WORKLOAD]
+    plan = []
+    for weight, template, model in rng.choices(WORKLOAD, weights=weights, k=total):
+        path = template if model is None else template.format(id=int(bounds[model] * rng.random() ** 2) + 1)
+        plan.append((template, path))
+    return plan
+
+
+class InProcessClient:
+    def __init__(self):
+        from app import app
+        self.app = app
+        self._local = threading.local()
+
+    def get(self, path):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.get(path)
+        response.close()
+        return response.status_code
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(self.base_url + path, timeout=30) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def run_phase(client, plan, concurrency):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+
+    def send(item):
+        route, path = item
+        start = time.perf_counter()
+        try:
+            status = client.get(path)
+        except Exception:
+            status = 599
+        latencies[route].append(time.perf_counter() - start)
+        if status >= 500:
+            errors[route] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, plan))
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentiles(samples):
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000
+
+
+def summarize(name, latencies, errors, elapsed):
+    samples = [sample for route_samples in latencies.values() for sample in route_samples]
+    p50, p95, p99 = percentiles(samples)
+    report = {"phase": name, "requests": len(samples), "errors": sum(errors.values()),
+              "seconds": round(elapsed, 3), "throughput": round(len(samples) / elapsed, 1),
+              "p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2), "routes": {}}
+    print(f"\n== {name}: {report['requests']} requests in {elapsed:.1f}s, {report['throughput']} req/s, "
+          f"{report['errors']} errors, p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms")
+    print(f"{'route':<32} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route in sorted(latencies, key=lambda r: -len(latencies[r])):
+        p50, p95, p99 = percentiles(latencies[route])
+        report["routes"][route] = {"count": len(latencies[route]), "errors": errors[route],
+                                   "p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2)}
+        print(f"{route:<32} {len(latencies[route]):>7} {errors[route]:>7} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f}")
+    return report
+
+
+def use_fakeredis():
+    import fakeredis
+    redis_client.client = fakeredis.FakeRedis()
+
+
+def clear_cache(fake):
+    """Empties the cache for the cold phase: the whole fakeredis server, or only the cached families of a real one."""
+    if fake:
+        redis_client.flushdb()
+        return
+    models = {*LIST_KEYS.values(), *DETAIL_PREFIXES.values(), *(model for model, _, _ in COLLECTIONS.values())}
+    cache_tags.invalidate_table(*models)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running API; defaults to driving the app in-process")
+    parser.add_argument("--requests", type=int, default=5_000, help="requests per phase")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fakeredis", action="store_true", help="use an in-memory fakeredis (in-process only)")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.fakeredis:
+        if args.url:
+            raise SystemExit("--fakeredis only applies to in-process runs")
+        use_fakeredis()
+    client = HttpClient(args.url) if args.url else InProcessClient()
+    plan = build_plan(args.requests, args.seed)
+
+    reports = []
+    clear_cache(args.fakeredis)  # cold: every key family starts empty
+    reports.append(summarize("cold cache", *run_phase(client, plan, args.concurrency)))
+    reports.append(summarize("warm cache", *run_phase(client, plan, args.concurrency)))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
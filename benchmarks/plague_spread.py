@@ -0,0 +1,82 @@
+"""
+Measures how many plague_sim ticks per second the vectorized engine sustains for a synthetic world,
+and optionally compares it with the row-by-row Python loop it replaces.
+
+Usage (from the repository root):
+    DATABASE_URL=sqlite:///benchmarks/bench.db python -m benchmarks.plague_spread
+    DATABASE_URL=sqlite:///benchmarks/bench.db python -m benchmarks.plague_spread --entities 100000 500000 --baseline
+
+The world is built in memory (nothing is read from or written to the database; DATABASE_URL only
+has to point somewhere importable). Entities are spread uniformly over WORLD_SIZE x WORLD_SIZE
+and 1% of them start infected with every plague.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import plague_sim
+from benchmarks.datagen import WORLD_SIZE
+
+PLAGUES = [(1, 5, 7), (2, 2, 20), (3, 9, 3)]  # (plague_id, spread_rate, duration in days)
+
+
+def build(entities, seed):
+    rng = np.random.default_rng(seed)
+    kind = (rng.random(entities) < 0.7).astype(np.int8)  # 70% rats, like datagen
+    sim = plague_sim.PlagueSimulation(
+        kind, np.arange(1, entities + 1), rng.uniform(0, WORLD_SIZE, entities), rng.uniform(0, WORLD_SIZE, entities),
+        [plague for plague, _, _ in PLAGUES], [rate for _, rate, _ in PLAGUES],
+        [duration for _, _, duration in PLAGUES], seed=seed)
+    for plague in range(len(PLAGUES)):
+        index = rng.choice(entities, size=max(1, entities // 100), replace=False)
+        sim.seed_infections(plague, index, np.full(len(index), sim.clock), np.full(len(index), np.nan),
+                            np.zeros(len(index), np.int64))
+    return sim
+
+
+def baseline_tick(sim, plague):
+    """The per-entity loop the game server runs today, kept for comparison: O(infected * entities)."""
+    radius = plague_sim.PLAGUE_SPREAD_RADIUS
+    chance = sim.infect_chance[plague]
+    infectious = [i for i in range(len(sim)) if sim.status[plague, i] == plague_sim.INFECTED]
+    newly_infected = []
+    for i in range(len(sim)):
+        if sim.status[plague, i] != plague_sim.SUSCEPTIBLE:
+            continue
+        exposure = sum(1 for j in infectious
+                       if abs(sim.x[i] - sim.x[j]) <= radius and abs(sim.y[i] - sim.y[j]) <= radius)
+        if exposure and sim.rng.random() < 1 - (1 - chance) ** exposure:
+            newly_infected.append(i)
+    for i in newly_infected:
+        sim.status[plague, i] = plague_sim.INFECTED
+
+
+def measure(label, entities, ticks, step):
+    start = time.perf_counter()
+    for _ in range(ticks):
+        step()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {entities:>10} {ticks:>6} {elapsed:>9.2f}s {ticks / elapsed:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, nargs="+", default=[10_000, 100_000, 250_000])
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", action="store_true",
+                        help="also time the row-by-row loop (one tick, first plague, at most 10k entities)")
+    args = parser.parse_args()
+
+    print(f"{'engine':<12} {'entities':>10} {'ticks':>6} {'elapsed':>10} {'ticks/s':>10}")
+    for entities in args.entities:
+        sim = build(entities, args.seed)
+        measure("vectorized", entities, args.ticks, sim.tick)
+        if args.baseline and entities <= 10_000:
+            sim = build(entities, args.seed)
+            measure("row-by-row", entities, 1, lambda: baseline_tick(sim, 0))
+
+
+if __name__ == "__main__":
+    main()
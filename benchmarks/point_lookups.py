@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of primary-key lookups per model: the filter_by().first() query the detail routes
+used to build, session.get() and the prebuilt statements of lookups.get().
+
+Usage (from the repository root, after benchmarks.datagen):
+    DATABASE_URL=sqlite:///benchmarks/bench.db python -m benchmarks.point_lookups
+    python -m benchmarks.point_lookups --lookups 20000 --models player stats colony
+
+Every variant runs the same random IDs in one session, with the identity map cleared after each
+lookup, so each one issues a query as on a cache miss in a fresh request. The differences between the
+variants are the cost of building the statement and deriving its cache key; the round trip is the same.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import func, select
+
+import cache_keys
+import lookups
+from db_routing import ReadSession
+
+DEFAULT_MODELS = ["player", "stats", "colony", "plague_rat", "game_event", "economy_transaction", "item", "plague"]
+
+
+def query_first(session, model, pk):
+    columns = cache_keys.primary_key_columns(model)
+    return session.query(model).filter_by(**{column.key: value for column, value in zip(columns, pk)}).first()
+
+
+def session_get(session, model, pk):
+    return session.get(model, pk)
+
+
+def prebuilt(session, model, pk):
+    return lookups.get(session, model, *pk)
+
+
+VARIANTS = {"query().first()": query_first, "session.get()": session_get, "lookups.get()": prebuilt}
+
+
+def run(variant, model, ids):
+    """Returns microseconds per lookup of the primary-key tuples `ids`, checking that every one is found."""
+    session = ReadSession()
+    try:
+        variant(session, model, ids[0])  # warm the compiled cache and the connection
+        session.expunge_all()
+        start = time.perf_counter()
+        for pk in ids:
+            if variant(session, model, pk) is None:
+                raise RuntimeError(f"{model.__tablename__} {pk} not found")
+            session.expunge_all()
+        return (time.perf_counter() - start) / len(ids) * 1e6
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare primary-key lookup strategies per model.")
+    parser.add_argument("--models", nargs="+", default=DEFAULT_MODELS, choices=sorted(cache_keys.DETAIL_PREFIXES))
+    parser.add_argument("--lookups", type=int, default=5000, help="lookups per model and variant")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per variant; the median is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'model':<22}" + "".join(f"{name:>18}" for name in VARIANTS) + f"{'speedup':>10}")
+    for prefix in args.models:
+        model = cache_keys.DETAIL_PREFIXES[prefix]
+        columns = cache_keys.primary_key_columns(model)
+        session = ReadSession()
+        try:
+            existing = [tuple(row) for row in
+                        session.execute(select(*columns).order_by(func.random()).limit(args.lookups))]
+        finally:
+            session.close()
+        if not existing:
+            print(f"{prefix:<22}skipped: empty table")
+            continue
+        ids = [rng.choice(existing) for _ in range(args.lookups)]
+        timings = {name: statistics.median(run(variant, model, ids) for _ in range(args.repeat))
+                   for name, variant in VARIANTS.items()}
+        print(f"{prefix:<22}"
+              + "".join(f"{timings[name]:>16.1f}us" for name in VARIANTS)
+              + f"{timings['query().first()'] / timings['lookups.get()']:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import os
+
+from sqlalchemy import inspect
+
+from models import Achievement, Battle, BattleParticipant, Colony, ColonyProgress, ColonyRat, DayNightTime, Economy, \
+    EffectType, Equipment, GameEvent, Item, Plague, PlagueAffected, PlagueRat, Player, PlayerAchievement, PlayerEquipment, \
+    Severity, Stats, Weather, WeatherEffects
+
+CACHE_TTL = int(os.getenv("CACHE_TTL", 3600))  # seconds, the default expiry of cached values (see ttl_policy.py)
+CACHE_GRACE_TTL = int(os.getenv("CACHE_GRACE_TTL", 3600))  # seconds a stale copy outlives its value, 0 disables
+
+# Keys holding a whole table, as cached by the list routes (e.g. /colonies -> "all_colonies").
+LIST_KEYS = {
+    "all_achievements": Achievement,
+    "all_colonies": Colony,
+    "all_colony_rats": ColonyRat,
+    "all_day_night_times": DayNightTime,
+    "all_economy_transactions": Economy,
+    "all_effect_types": EffectType,
+    "all_equipment": Equipment,
+    "all_game_events": GameEvent,
+    "all_items": Item,
+    "all_plagues": Plague,
+    "all_plague_affected": PlagueAffected,
+    "all_plague_rats": PlagueRat,
+    "all_players": Player,
+    "all_player_achievements": PlayerAchievement,
+    "all_player_equipment": PlayerEquipment,
+    "all_severities": Severity,
+    "all_stats": Stats,
+    "all_weather": Weather,
+    "all_weather_effects": WeatherEffects,
+}
+
+# Prefixes of single-row keys, as cached by the detail routes (e.g. /colonies/7 -> "colony:7").
+# Composite primary keys are joined with ":" in column order (e.g. "colony_rat:3:12").
+DETAIL_PREFIXES = {
+    "achievement": Achievement,
+    "battle": Battle,
+    "battle_participant": BattleParticipant,
+    "colony": Colony,
+    "colony_rat": ColonyRat,
+    "day_night_time": DayNightTime,
+    "economy_transaction": Economy,
+    "effect_type": EffectType,
+    "equipment": Equipment,
+    "game_event": GameEvent,
+    "item": Item,
+    "plague": Plague,
+    "plague_affected": PlagueAffected,
+    "plague_rat": PlagueRat,
+    "player": Player,
+    "player_achievement": PlayerAchievement,
+    "player_equipment": PlayerEquipment,
+    "severity": Severity,
+    "stats": Stats,
+    "weather": Weather,
+    "weather_effect": WeatherEffects,
+}
+
+# Keys holding the rows of one table that share a parent, by family: (model, columns, fixed values).
+# The IDs in the key are the values of `columns`, e.g. "player:5:achievements" holds the PlayerAchievement
+# rows with player_id 5, and "plague_rat:9:infections" the PlagueAffected rows with entity_type "rat"
+# and entity_id 9 (":active" variants hold a subset of the same rows).
+COLLECTIONS = {
+    "colony_progress": (ColonyProgress, ("colony_id",), {}),
+    "player:achievements": (PlayerAchievement, ("player_id",), {}),
+    "achievement:players": (PlayerAchievement, ("achievement_id",), {}),
+    "player:infections": (PlagueAffected, ("entity_id",), {"entity_type": "player"}),
+    "player:infections:active": (PlagueAffected, ("entity_id",), {"entity_type": "player"}),
+    "plague_rat:infections": (PlagueAffected, ("entity_id",), {"entity_type": "rat"}),
+    "plague_rat:infections:active": (PlagueAffected, ("entity_id",), {"entity_type": "rat"}),
+}
+
+
+def family_of(key):
+    """
+    Returns the family a cache key belongs to, i.e. the key with its IDs stripped:
+    "all_players" -> "all_players", "player:5" -> "player", "player:5:achievements" -> "player:achievements".
+    """
+    return ":".join(part for part in key.split(":") if not part.isdigit())
+
+
+def stale_key(key):
+    """The key of the stale copy kept for `key` (see stale_cache.py)."""
+    return f"stale:{key}"
+
+
+def detail_key(prefix, *pk):
+    return ":".join([prefix, *(str(value) for value in pk)])
+
+
+def infection_keys(entity_type, entity_id):
+    """
+    Keys of an entity's cached infection lists, e.g. ("player:5:infections", "player:5:infections:active");
+    `entity_type` is the plague_affected.entity_type value ("player" or "rat").
+    """
+    prefix = "plague_rat" if entity_type == "rat" else entity_type
+    return f"{prefix}:{entity_id}:infections", f"{prefix}:{entity_id}:infections:active"
+
+
+def key_for(prefix, row):
+    """Returns the single-row key of an ORM instance, e.g. key_for("colony", colony) -> "colony:7"."""
+    return detail_key(prefix, *inspect(type(row)).primary_key_from_instance(row))
+
+
+def primary_key_columns(model):
+    return inspect(model).primary_key
+
+
+def parse_detail_key(key):
+    """Returns (model, primary key tuple) for a single-row key, or None if the key is not one."""
+    prefix, _, rest = key.partition(":")
+    model = DETAIL_PREFIXES.get(prefix)
+    if model is None or not rest:
+        return None
+    parts = rest.split(":")
+    if len(parts) != len(primary_key_columns(model)) or not all(part.isdigit() for part in parts):
+        return None
+    return model, tuple(int(part) for part in parts)
+
+
+def load(session, key):
+    """
+    Builds the payload the routes would cache under `key` straight from the database.
+    Returns None when the key is unknown or the row does not exist.
+    """
+    if key in LIST_KEYS:
+        return [row.serialize() for row in session.query(LIST_KEYS[key]).all()]
+    parsed = parse_detail_key(key)
+    if parsed is None:
+        return None
+    model, pk = parsed
+    row = session.get(model, pk if len(pk) > 1 else pk[0])
+    return row.serialize() if row is not None else None
+
+
+# Tags name the rows a cached value was built from, so writers can invalidate by row rather than by key:
+#   "colony"                            the whole table (list keys)
+#   "colony:7"                          one row (detail keys)
+#   "player_achievement:player_id=5"    the rows of a collection (COLLECTIONS keys)
+#   "colony:missing"                    rows not found (negative cache entries, see negative_cache.py)
+
+def collection_tag(model, values):
+    return f"{model.__tablename__}:" + ",".join(f"{column}={value}" for column, value in sorted(values.items()))
+
+
+def missing_tag(model):
+    return f"{model.__tablename__}:missing"
+
+
+def tags_for_key(key):
+    """Returns the tags of the rows the value cached under `key` is built from; [] for unknown keys."""
+    if key in LIST_KEYS:
+        return [LIST_KEYS[key].__tablename__]
+    parsed = parse_detail_key(key)
+    if parsed is not None:
+        model, pk = parsed
+        return [":".join([model.__tablename__, *(str(value) for value in pk)])]
+    family = family_of(key)
+    if family in COLLECTIONS:
+        model, columns, fixed = COLLECTIONS[family]
+        ids = [part for part in key.split(":") if part.isdigit()]
+        return [collection_tag(model, {**fixed, **dict(zip(columns, ids))})]
+    return []
+
+
+def tags_for_row(model, values):
+    """
+    Returns every tag a change to one row of `model` affects: its table, the table's negative entries
+    (the row may be new), the row itself and each collection it belongs to. `values` is an ORM instance or a dict of column values; collections
+    whose columns are missing from a dict are skipped.
+    """
+    if not isinstance(values, dict):
+        values = {column.key: getattr(values, column.key) for column in inspect(model).columns}
+    tags = [model.__tablename__, missing_tag(model)]
+    pk = [values.get(column.key) for column in primary_key_columns(model)]
+    if all(value is not None for value in pk):
+        tags.append(":".join([model.__tablename__, *(str(value) for value in pk)]))
+    for collection_model, columns, fixed in COLLECTIONS.values():
+        names = (*fixed, *columns)
+        if collection_model is model and all(values.get(name) is not None for name in names):
+            # The row's own values, so a rat's infection yields the rat collection's tag.
+            tag = collection_tag(model, {name: values[name] for name in names})
+            if tag not in tags:
+                tags.append(tag)
+    return tags
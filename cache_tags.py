@@ -0,0 +1,162 @@
+"""
+Tag registry for the Redis cache. Every value the routes cache is stored with the tags of the rows it
+was built from (see cache_keys.tags_for_key), and writers invalidate by tag instead of guessing key
+names or flushing Redis.
+
+Layout in Redis, expiring with the keys they describe:
+    tag:<tag>            set of the cache keys carrying <tag>, e.g. tag:colony:7 -> {"colony:7"}
+    tagidx:<table>       set of the tag:<...> sets for one table, so a table is invalidated without
+                         KEYS or SCAN
+    stale:<key>          hash of the last value stored under <key> and when, expiring CACHE_GRACE_TTL
+                         seconds after it and not removed by invalidation (see stale_cache.py)
+
+invalidate() removes every key carrying any of the given tags (and their table's list keys), plus the
+tag sets themselves, in one server-side script call.
+
+Usage:
+    python cache_tags.py colony:7 player_achievement:player_id=5
+"""
+import logging
+import sys
+import time
+
+import cache_keys
+import compression
+import ttl_policy
+from db_utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+UNLINK_BATCH = 1000  # keys per UNLINK inside the script, well below Lua's unpack() limit
+
+# KEYS are tag:<tag> sets or tagidx:<table> indexes, the latter expanding to all of their tag sets.
+_INVALIDATE = f"""
+local removed = 0
+local function drop(tagset)
+    local members = redis.call('SMEMBERS', tagset)
+    for i = 1, #members, {UNLINK_BATCH} do
+        removed = removed + redis.call('UNLINK', unpack(members, i, math.min(i + {UNLINK_BATCH - 1}, #members)))
+    end
+    redis.call('UNLINK', tagset)
+end
+for _, key in ipairs(KEYS) do
+    if string.sub(key, 1, 7) == 'tagidx:' then
+        for _, tagset in ipairs(redis.call('SMEMBERS', key)) do
+            drop(tagset)
+        end
+        redis.call('UNLINK', key)
+    else
+        drop(key)
+    end
+end
+return removed
+"""
+
+
+def tag_set(tag):
+    return f"tag:{tag}"
+
+
+def tag_index(table):
+    return f"tagidx:{table}"
+
+
+def _register(pipe, key, ex, tags=()):
+    """Queues the commands that file `key` under its tags (plus `tags`); sets only ever extend their expiry."""
+    for tag in [*cache_keys.tags_for_key(key), *tags]:
+        name, index = tag_set(tag), tag_index(tag.partition(":")[0])
+        pipe.sadd(name, key)
+        pipe.sadd(index, name)
+        for member in (name, index):
+            if ex is not None:
+                pipe.expire(member, ex, nx=True)
+                pipe.expire(member, ex, gt=True)
+
+
+def _set(pipe, key, value, ex, tags, stale=True):
+    """
+    Queues the SET of `key` and its compressed variants, all filed under the key's tags, and with
+    `stale` the stale copy that outlives them by CACHE_GRACE_TTL.
+    """
+    pipe.set(key, value, ex=ex)
+    _register(pipe, key, ex, tags)
+    if stale and cache_keys.CACHE_GRACE_TTL > 0:
+        # Untagged on purpose: invalidation drops the value, but the copy stays for stale_cache.py.
+        name = cache_keys.stale_key(key)
+        pipe.hset(name, mapping={"value": value, "stored_at": int(time.time())})
+        pipe.expire(name, ex + cache_keys.CACHE_GRACE_TTL)
+    variants = compression.compress(value)
+    for encoding in compression.ENCODINGS:
+        name = compression.variant_key(key, encoding)
+        if encoding in variants:
+            pipe.set(name, variants[encoding], ex=ex)
+            _register(pipe, name, ex, [*cache_keys.tags_for_key(key), *tags])
+        else:
+            pipe.unlink(name)  # a smaller new value must not leave an outdated variant behind
+
+
+def store(key, value, ex=None, tags=(), stale=True):
+    """
+    SETs `key` and files it under the tags of the rows it was built from, plus any extra `tags`, in one
+    round trip. Large values are also stored precompressed (see compression.py). Without `ex`, the
+    key expires after the TTL ttl_policy chooses for its family. Unless `stale` is False, a copy is
+    kept for CACHE_GRACE_TTL seconds longer, for serving while MySQL is unavailable.
+    """
+    if ex is None:
+        ex = ttl_policy.ttl_for(key)
+    pipe = redis_client.pipeline(transaction=True)
+    _set(pipe, key, value, ex, tags, stale)
+    return redis_client.execute(pipe, default=False) is not False
+
+
+def store_many(mapping, ex=None):
+    """store() for several keys at once, still a single round trip."""
+    if not mapping:
+        return True
+    pipe = redis_client.pipeline(transaction=False)
+    for key, value in mapping.items():
+        _set(pipe, key, value, ttl_policy.ttl_for(key) if ex is None else ex, ())
+    return redis_client.execute(pipe, default=False) is not False
+
+
+def invalidate(*tags):
+    """
+    Deletes every cached key carrying one of `tags` and returns how many were deleted (0 if Redis is
+    down). Tags are hierarchical: a row or collection tag ("colony:7") also invalidates its table
+    tag ("colony"), because the table's list keys contain the row too.
+    """
+    expanded = {}
+    for tag in tags:
+        expanded[tag] = None
+        expanded[tag.partition(":")[0]] = None
+    ttl_policy.policy.record_invalidation(tag.partition(":")[0] for tag in tags)
+    return _run([tag_set(tag) for tag in expanded])
+
+
+def invalidate_table(*models):
+    """Deletes every cached key built from any row of the given models' tables."""
+    ttl_policy.policy.record_invalidation(model.__tablename__ for model in models)
+    return _run([tag_index(model.__tablename__) for model in models])
+
+
+def invalidate_rows(model, rows):
+    """Deletes every cached key affected by a change to `rows` (ORM instances or dicts of column values)."""
+    tags = {}
+    for row in rows:
+        tags.update(dict.fromkeys(cache_keys.tags_for_row(model, row)))
+    return invalidate(*tags)
+
+
+def _run(names):
+    removed = 0
+    for start in range(0, len(names), UNLINK_BATCH):
+        batch = names[start:start + UNLINK_BATCH]
+        removed += redis_client.eval(_INVALIDATE, len(batch), *batch) or 0
+    return removed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if not sys.argv[1:]:
+        raise SystemExit("usage: python cache_tags.py TAG [TAG ...]")
+    print(f"invalidated: {invalidate(*sys.argv[1:])}")
@@ -0,0 +1,200 @@
+"""
+Prefills the Redis cache from MySQL after a deploy or a flush, and optionally keeps hot keys
+warm by reloading them shortly before they expire.
+
+Usage:
+    python cache_warmup.py                 # warm every family in CACHE_WARM_FAMILIES
+    python cache_warmup.py all_colonies player
+"""
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import cache_keys
+import cache_tags
+from cache_keys import DETAIL_PREFIXES, LIST_KEYS
+from db_routing import ReadSession
+from db_utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Families are list keys ("all_colonies") or detail prefixes ("player", "colony").
+CACHE_WARM_FAMILIES = [family.strip() for family in
+                       os.getenv("CACHE_WARM_FAMILIES", ",".join([*LIST_KEYS, "player", "colony"])).split(",")
+                       if family.strip()]
+CACHE_WARM_ON_START = os.getenv("CACHE_WARM_ON_START", "false").lower() == "true"
+CACHE_WARM_CONCURRENCY = int(os.getenv("CACHE_WARM_CONCURRENCY", 2))  # parallel DB sessions used for warming
+CACHE_WARM_DETAIL_LIMIT = int(os.getenv("CACHE_WARM_DETAIL_LIMIT", 10000))  # newest rows warmed per detail family
+CACHE_WARM_BATCH_SIZE = int(os.getenv("CACHE_WARM_BATCH_SIZE", 500))  # rows fetched and SET per round trip
+CACHE_REFRESH_INTERVAL = float(os.getenv("CACHE_REFRESH_INTERVAL", 0))  # seconds, 0 disables the refresher
+CACHE_REFRESH_AHEAD = int(os.getenv("CACHE_REFRESH_AHEAD", 300))  # reload keys expiring within this many seconds
+CACHE_HOT_KEYS = int(os.getenv("CACHE_HOT_KEYS", 1000))  # detail keys tracked per process for refreshing
+
+
+def warm_family(family):
+    """Prefills one key family from MySQL and returns the number of keys written."""
+    session = ReadSession()
+    try:
+        if family in LIST_KEYS:
+            payload = cache_keys.load(session, family)
+            cache_tags.store(family, json.dumps(payload))
+            return 1
+
+        model = DETAIL_PREFIXES[family]
+        newest_first = [column.desc() for column in cache_keys.primary_key_columns(model)]
+        query = session.query(model).order_by(*newest_first).limit(CACHE_WARM_DETAIL_LIMIT)
+        written = 0
+        batch = {}
+        for row in query.yield_per(CACHE_WARM_BATCH_SIZE):
+            batch[cache_keys.key_for(family, row)] = json.dumps(row.serialize())
+            if len(batch) >= CACHE_WARM_BATCH_SIZE:
+                cache_tags.store_many(batch)
+                written += len(batch)
+                batch = {}
+        cache_tags.store_many(batch)
+        return written + len(batch)
+    finally:
+        session.close()
+
+
+def warm(families=None):
+    """
+    Warms the given families (defaults to CACHE_WARM_FAMILIES), at most CACHE_WARM_CONCURRENCY at a time.
+    Returns a dict of family -> keys written; families that failed are logged and reported as 0.
+    """
+    families = list(families or CACHE_WARM_FAMILIES)
+    unknown = [family for family in families if family not in LIST_KEYS and family not in DETAIL_PREFIXES]
+    if unknown:
+        raise ValueError(f"Unknown cache key families: {', '.join(unknown)}")
+
+    def safe_warm(family):
+        try:
+            return warm_family(family)
+        except Exception as e:
+            logger.error(f"Error warming cache family {family}: {e}")
+            return 0
+
+    with ThreadPoolExecutor(max_workers=CACHE_WARM_CONCURRENCY) as executor:
+        counts = dict(zip(families, executor.map(safe_warm, families)))
+    logger.info(f"Cache warm-up wrote {sum(counts.values())} keys across {len(families)} families")
+    return counts
+
+
+class HotKeyTracker:
+    """Bounded LRU of the detail keys read in this process; registered as a redis_client listener."""
+
+    def __init__(self, size):
+        self.size = size
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __call__(self, key, value, ok):
+        if value is None:  # only hits are worth keeping warm
+            return
+        if isinstance(key, bytes):
+            key = key.decode('utf-8')
+        if cache_keys.parse_detail_key(key) is None:
+            return
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            if len(self._keys) > self.size:
+                self._keys.popitem(last=False)
+
+    def keys(self):
+        with self._lock:
+            return list(self._keys)
+
+
+hot_keys = HotKeyTracker(CACHE_HOT_KEYS)
+
+
+def reload_keys(keys):
+    """Reloads `keys` from MySQL, batching single-column primary keys into one IN query per model."""
+    payloads = {}
+    by_prefix = defaultdict(list)
+    session = ReadSession()
+    try:
+        for key in keys:
+            parsed = cache_keys.parse_detail_key(key)
+            if parsed is None or len(parsed[1]) > 1:
+                payload = cache_keys.load(session, key)
+                if payload is not None:
+                    payloads[key] = json.dumps(payload)
+            else:
+                by_prefix[key.partition(":")[0]].append(parsed[1][0])
+
+        for prefix, ids in by_prefix.items():
+            model = DETAIL_PREFIXES[prefix]
+            pk_column = cache_keys.primary_key_columns(model)[0]
+            for row in session.query(model).filter(pk_column.in_(ids)).all():
+                payloads[cache_keys.key_for(prefix, row)] = json.dumps(row.serialize())
+    finally:
+        session.close()
+    cache_tags.store_many(payloads)
+    return len(payloads)
+
+
+def refresh_expiring():
+    """Reloads warmed list keys and tracked hot keys that are missing or expire within CACHE_REFRESH_AHEAD."""
+    candidates = [family for family in CACHE_WARM_FAMILIES if family in LIST_KEYS] + hot_keys.keys()
+    if not candidates:
+        return 0
+    pipe = redis_client.pipeline()
+    for key in candidates:
+        pipe.ttl(key)
+    ttls = redis_client.execute(pipe)
+    if ttls is None:  # Redis unavailable; nothing useful to do this round
+        return 0
+
+    # TTL is -2 for a missing key and -1 for a key without expiry, which never needs a refresh.
+    due = [key for key, ttl in zip(candidates, ttls) if ttl == -2 or 0 <= ttl < CACHE_REFRESH_AHEAD]
+    if not due:
+        return 0
+    chunks = [due[i:i + CACHE_WARM_BATCH_SIZE] for i in range(0, len(due), CACHE_WARM_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=CACHE_WARM_CONCURRENCY) as executor:
+        refreshed = sum(executor.map(reload_keys, chunks))
+    logger.info(f"Refreshed {refreshed} cache keys ahead of expiry")
+    return refreshed
+
+
+class CacheRefresher(threading.Thread):
+    """Daemon thread calling refresh_expiring() every `interval` seconds."""
+
+    def __init__(self, interval):
+        super().__init__(name="cache-refresher", daemon=True)
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                refresh_expiring()
+            except Exception as e:
+                logger.error(f"Error refreshing cache: {e}")
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_background_tasks():
+    """Starts the optional start-up warm-up and refresher configured through the environment."""
+    if CACHE_WARM_ON_START:
+        threading.Thread(target=warm, name="cache-warmup", daemon=True).start()
+    if CACHE_REFRESH_INTERVAL > 0:
+        redis_client.listeners.append(hot_keys)
+        refresher = CacheRefresher(CACHE_REFRESH_INTERVAL)
+        refresher.start()
+        return refresher
+    return None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    counts = warm(sys.argv[1:] or None)
+    for family, count in counts.items():
+        print(f"{family}: {count}")
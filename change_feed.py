@@ -0,0 +1,167 @@
+"""
+Change log behind GET /changes?since=<token>, the delta sync API for clients that keep local copies
+of colonies, plague rats and plagues.
+
+Every ORM flush that inserts, updates or deletes a row of a tracked model appends a row to the
+`change_log` table in the same transaction, so a change is logged exactly when it commits. Clients
+pass the token from their previous response and get back the current state of every row that
+changed since then (or just its ID if it was deleted), plus a new token.
+
+Only changes made through the ORM unit of work are logged. Code that writes tracked tables with
+Core statements (insert(), update(), delete()) must call record() itself.
+
+Change IDs are assigned when a row is flushed, but transactions commit in any order, so a
+change with a lower ID can become visible after a higher one. To keep clients from skipping such
+changes, the feed leaves out changes newer than CHANGE_FEED_SETTLE seconds. Delays smaller than
+that window are safe.
+
+Usage:
+    python change_feed.py prune            # delete log rows older than CHANGE_LOG_RETENTION_DAYS
+"""
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from db_routing import WriteSession
+from models import ChangeLog, Colony, Plague, PlagueRat
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_PAGE_SIZE = int(os.getenv("CHANGE_FEED_PAGE_SIZE", 1000))  # log rows read per /changes call
+CHANGE_FEED_SETTLE = float(os.getenv("CHANGE_FEED_SETTLE", 5))  # seconds before a change is served
+CHANGE_LOG_RETENTION_DAYS = int(os.getenv("CHANGE_LOG_RETENTION_DAYS", 30))
+
+# Table name -> model for every table clients can sync.
+TRACKED = {model.__tablename__: model for model in (Colony, PlagueRat, Plague)}
+
+
+class TokenExpired(Exception):
+    """The client's token predates the retained change log; it has to download the full lists again."""
+
+
+def _row_id(model, instance):
+    columns = model.__table__.primary_key.columns
+    return ":".join(str(getattr(instance, column.key)) for column in columns)
+
+
+def _parse_row_id(model, row_id):
+    columns = list(model.__table__.primary_key.columns)
+    return tuple(column.type.python_type(part) for column, part in zip(columns, row_id.split(":")))
+
+
+def record(session, model, row_ids, operation):
+    """Logs `operation` for rows of `model` written with Core statements, in `session`'s transaction."""
+    rows = [{"table_name": model.__tablename__,
+             "row_id": ":".join(str(part) for part in (row_id if isinstance(row_id, tuple) else (row_id,))),
+             "operation": operation}
+            for row_id in row_ids]
+    if rows:
+        session.connection().execute(insert(ChangeLog), rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _log_flush(session, flush_context):
+    rows = []
+    for operation, instances in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for instance in instances:
+            model = type(instance)
+            if model.__tablename__ not in TRACKED:
+                continue
+            if operation == "update" and not session.is_modified(instance, include_collections=False):
+                continue
+            rows.append({"table_name": model.__tablename__, "row_id": _row_id(model, instance),
+                         "operation": operation})
+    if rows:
+        session.connection().execute(insert(ChangeLog), rows)
+
+
+def _settled():
+    return datetime.now() - timedelta(seconds=CHANGE_FEED_SETTLE)
+
+
+def current_token(session):
+    """Token for a client about to download the full lists; changes still settling are replayed to it later."""
+    latest = select(func.max(ChangeLog.change_id)).where(ChangeLog.changed_at <= _settled())
+    return str(session.execute(latest).scalar() or 0)
+
+
+def changes_since(session, since, tables=None, limit=CHANGE_FEED_PAGE_SIZE):
+    """
+    Returns the changes logged after token `since` as a dict with "changes", "next" (the token for
+    the following call) and "more" (True when another page is waiting). Several changes to one row
+    are collapsed into its latest state. Raises TokenExpired when changes after `since` have been pruned.
+    """
+    tables = [table for table in (tables or TRACKED) if table in TRACKED]
+    if since < pruned_through(session):
+        raise TokenExpired(since)
+
+    entries = session.execute(
+        select(ChangeLog)
+        .where(ChangeLog.change_id > since, ChangeLog.table_name.in_(tables), ChangeLog.changed_at <= _settled())
+        .order_by(ChangeLog.change_id)
+        .limit(limit + 1)
+    ).scalars().all()
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}  # (table, row_id) -> last change, in log order
+    for entry in entries:
+        latest.pop((entry.table_name, entry.row_id), None)
+        latest[(entry.table_name, entry.row_id)] = entry
+
+    # Fetch the current state of every changed row with one query per table.
+    current = {}
+    for table in {table for table, _ in latest}:
+        model = TRACKED[table]
+        keys = [_parse_row_id(model, row_id) for (t, row_id) in latest if t == table]
+        pk = tuple_(*model.__table__.primary_key.columns)
+        for instance in session.execute(select(model).where(pk.in_(keys))).scalars():
+            current[(table, _row_id(model, instance))] = instance.serialize()
+
+    changes = []
+    for (table, row_id), entry in latest.items():
+        row = current.get((table, row_id))
+        # A row logged as inserted or updated may have been deleted since; report what is true now.
+        changes.append({"table": table, "id": row_id, "operation": "delete" if row is None else "upsert",
+                        "row": row})
+    next_token = entries[-1].change_id if entries else since
+    return {"changes": changes, "next": str(next_token), "more": more}
+
+
+def pruned_through(session):
+    """The highest change ID removed by prune(), read from the marker row prune() leaves behind."""
+    marker = session.execute(
+        select(ChangeLog.row_id).where(ChangeLog.operation == "prune").order_by(ChangeLog.change_id.desc()).limit(1)
+    ).scalar()
+    return int(marker) if marker is not None else 0
+
+
+def prune(days=CHANGE_LOG_RETENTION_DAYS):
+    """Deletes change log rows older than `days` and returns how many were removed."""
+    cutoff = datetime.now() - timedelta(days=days)
+    session = WriteSession()
+    try:
+        with session.begin():
+            through = session.execute(
+                select(func.max(ChangeLog.change_id)).where(ChangeLog.changed_at < cutoff)).scalar()
+            if through is None:
+                return 0
+            result = session.execute(delete(ChangeLog).where(ChangeLog.change_id <= through))
+            # Tokens below `through` can no longer be served; the marker lets /changes tell.
+            session.execute(insert(ChangeLog).values(table_name=ChangeLog.__tablename__, row_id=str(through),
+                                                     operation="prune"))
+        logger.info(f"Pruned {result.rowcount} change log rows older than {cutoff}")
+        return result.rowcount
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ["prune"]:
+        raise SystemExit("usage: python change_feed.py prune")
+    print(f"pruned: {prune()}")
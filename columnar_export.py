@@ -0,0 +1,137 @@
+"""
+Columnar bulk export of any table in models.py for analytics, as Parquet files or an Arrow IPC stream.
+
+Rows are read with a server-side cursor (stream_results) in partitions of EXPORT_BATCH_SIZE and each
+partition becomes one Arrow record batch, so memory stays bounded by the batch size however large the
+table is. Column types map to their Arrow equivalents: INT to int32, DECIMAL(p, s) to decimal128(p, s)
+(no float rounding of coordinates), DATETIME to timestamp[us] (UTC for timezone-aware columns),
+and strings and text to string. Password hashes are left out (EXCLUDED_COLUMNS).
+
+    GET /admin/export/economy                         Arrow IPC stream (see adminroutes.py)
+
+    pyarrow.ipc.open_stream(response.raw).read_pandas()
+
+Usage:
+    python columnar_export.py economy game_event --out exports/    # one Parquet file per table
+"""
+import argparse
+import logging
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import BigInteger, DateTime, Integer, Numeric, String, select
+
+from db_routing import ReadSession
+from db_utils import Base
+from models import Player
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 10000))  # rows per record batch and Parquet row group
+EXPORT_PARQUET_COMPRESSION = os.getenv("EXPORT_PARQUET_COMPRESSION", "zstd")
+
+# Table name -> model for every model in models.py.
+MODELS = {mapper.class_.__tablename__: mapper.class_ for mapper in Base.registry.mappers}
+
+# Credentials are never exported.
+EXCLUDED_COLUMNS = {Player.__table__.c.password_hash}
+
+
+def arrow_type(column_type):
+    """The Arrow type for a SQLAlchemy column type."""
+    if isinstance(column_type, BigInteger):
+        return pa.int64()
+    if isinstance(column_type, Integer):
+        return pa.int32()
+    if isinstance(column_type, Numeric):
+        return pa.decimal128(column_type.precision, column_type.scale)
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us", tz="UTC" if column_type.timezone else None)
+    if isinstance(column_type, String):  # includes Text
+        return pa.string()
+    raise TypeError(f"no Arrow type for {column_type!r}")
+
+
+def columns(model):
+    """The columns of `model`'s table that are exported, in table order."""
+    return [column for column in model.__table__.columns if column not in EXCLUDED_COLUMNS]
+
+
+def schema(model):
+    return pa.schema([pa.field(column.name, arrow_type(column.type), nullable=column.nullable)
+                      for column in columns(model)])
+
+
+def batches(model, batch_size=EXPORT_BATCH_SIZE):
+    """Yields the rows of `model`'s table as Arrow record batches of at most `batch_size` rows."""
+    table = model.__table__
+    arrow_schema = schema(model)
+    session = ReadSession()
+    try:
+        result = session.execute(select(*columns(model)).order_by(*table.primary_key.columns)
+                                 .execution_options(stream_results=True, yield_per=batch_size))
+        for rows in result.partitions():
+            yield pa.RecordBatch.from_arrays([pa.array(values, type=field.type)
+                                              for values, field in zip(zip(*rows), arrow_schema)], schema=arrow_schema)
+    finally:
+        session.close()
+
+
+def write_parquet(model, path, batch_size=EXPORT_BATCH_SIZE):
+    """Writes `model`'s table to a Parquet file, one row group per batch, and returns the row count."""
+    rows = 0
+    with pq.ParquetWriter(path, schema(model), compression=EXPORT_PARQUET_COMPRESSION) as writer:
+        for batch in batches(model, batch_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+class _Chunks:
+    """Minimal writable file collecting what the IPC writer produces, drained after every batch."""
+
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b"".join(self.chunks), []
+        return data
+
+
+def ipc_stream(model, batch_size=EXPORT_BATCH_SIZE):
+    """Yields `model`'s table as the bytes of an Arrow IPC stream, one chunk per record batch."""
+    sink = _Chunks()
+    with pa.ipc.new_stream(sink, schema(model)) as writer:
+        yield sink.drain()
+        for batch in batches(model, batch_size):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()  # end-of-stream marker
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export tables from models.py to Parquet files.")
+    parser.add_argument("tables", nargs="+")
+    parser.add_argument("--out", default=".", help="directory for the <table>.parquet files")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    unknown = [table for table in args.tables if table not in MODELS]
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(unknown)}")
+    os.makedirs(args.out, exist_ok=True)
+    for table in args.tables:
+        path = os.path.join(args.out, f"{table}.parquet")
+        print(f"{table}: {write_parquet(MODELS[table], path, args.batch_size)} rows -> {path}")
@@ -0,0 +1,86 @@
+"""
+Precompressed variants of cached payloads.
+
+cache_tags.store() compresses every value of at least COMPRESS_MIN_BYTES once, when it is written, and
+stores the results next to it as <key>:gzip and (with the optional `brotli` package installed) <key>:br.
+The variants carry the same tags and TTL as the value itself. The routes read a key with get(), which
+fetches the best variant the client accepts in a single round trip. respond() then sends the stored
+bytes as they are, so a cache hit costs no compression and no JSON parsing or re-encoding.
+"""
+import gzip
+import logging
+import os
+
+from flask import Response, g, request
+
+from db_utils import redis_client
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are stored
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))  # smaller values are only stored uncompressed
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+
+# Content-Encoding -> compressor, best first.
+ENCODINGS = {}
+if brotli is not None:
+    ENCODINGS["br"] = lambda data: brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+ENCODINGS["gzip"] = lambda data: gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def variant_key(key, encoding):
+    return f"{key}:{encoding}"
+
+
+def variant_keys(key):
+    return [variant_key(key, encoding) for encoding in ENCODINGS]
+
+
+def compress(value):
+    """Returns {variant key suffix: compressed bytes} for a value worth compressing, else {}."""
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    if len(value) < COMPRESS_MIN_BYTES:
+        return {}
+    variants = {}
+    for encoding, compressor in ENCODINGS.items():
+        compressed = compressor(value)
+        if len(compressed) < len(value):
+            variants[encoding] = compressed
+    return variants
+
+
+def accepted():
+    """The encodings the current request accepts, in order of preference."""
+    accept = request.accept_encodings
+    return [encoding for encoding in ENCODINGS if accept[encoding] > 0]
+
+
+def get(key):
+    """
+    Reads a cached value for the current request. Returns (encoding, value), where encoding is None
+    for the plain value, trying the accepted variants first. `key` is remembered as the request's
+    cache key, whose stale copy is served if the request then fails (see stale_cache.py).
+    """
+    g.cache_key = key
+    encodings = accepted()
+    if not encodings:
+        return None, redis_client.get(key)
+    found, value = redis_client.get_first(*(variant_key(key, encoding) for encoding in encodings), key)
+    if found is None or found == key:
+        return None, value
+    return found.rpartition(":")[2], value
+
+
+def respond(value, encoding=None):
+    """A JSON response sending `value` (a serialized payload, plain or in `encoding`) byte for byte."""
+    response = Response(value, mimetype="application/json")
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
@@ -0,0 +1,212 @@
+"""
+Routes read-only sessions to MySQL read replicas and keeps the primary for writes.
+
+Replicas are configured with DATABASE_REPLICA_URLS (comma-separated SQLAlchemy URLs). A background
+thread per replica and process health-checks it every REPLICA_CHECK_INTERVAL seconds, so requests only
+read the last result and never wait for a check. Replicas that are unreachable or lag more than
+REPLICA_MAX_LAG seconds behind the primary are skipped, and reads fall back to the primary when no
+replica is usable (also until the first check has finished). A replica whose connection fails during
+a request is marked unhealthy at once, and the session retries the statement on the primary.
+
+A read that misses the cache right after a write would refill it from a replica that may not have the
+write yet, and the old row would then stay cached for the key's whole TTL. So a session reads a table
+from the primary while that table's last cache invalidation (recorded by ttl_policy.py for every
+cache_tags invalidation) is less than REPLICA_MAX_LAG seconds old.
+Without replicas, ReadSession behaves like Session(bind=engine).
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import Delete, Insert, Update, create_engine, event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker
+
+import ttl_policy
+from db_utils import redis_client
+from models import engine as primary_engine
+
+logger = logging.getLogger(__name__)
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", 5))  # seconds behind the primary before a replica is skipped
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", 2))  # seconds between health checks
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", 2))  # seconds, so a dead replica can't stall reads
+
+
+def replication_lag(conn):
+    """Seconds the server behind `conn` lags its source; 0 for servers that are not replicas (e.g. SQLite)."""
+    if conn.dialect.name != "mysql":
+        conn.exec_driver_sql("SELECT 1")
+        return 0.0
+    try:
+        row = conn.exec_driver_sql("SHOW REPLICA STATUS").mappings().first()
+    except DBAPIError:  # MySQL < 8.0.22
+        row = conn.exec_driver_sql("SHOW SLAVE STATUS").mappings().first()
+    if row is None:
+        return 0.0
+    lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return float("inf") if lag is None else float(lag)  # NULL lag means replication is stopped
+
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.lag = None
+        self.healthy = False
+        self.checked_at = 0.0
+        event.listen(engine, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        """Marks the replica unhealthy when connecting to it fails or a connection to it drops."""
+        if context.is_pre_ping or not (context.connection is None or context.is_disconnect):
+            return
+        if self.healthy:
+            logger.error(f"Lost the connection to replica {self.name}, routing reads elsewhere: "
+                         f"{context.original_exception}")
+        self.healthy = False
+        self.lag = None
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                self.lag = replication_lag(conn)
+            self.healthy = self.lag <= REPLICA_MAX_LAG
+            if not self.healthy:
+                logger.warning(f"Replica {self.name} is {self.lag}s behind, routing reads elsewhere")
+        except DBAPIError as e:
+            self.lag = None
+            self.healthy = False
+            logger.error(f"Replica {self.name} health check failed: {e}")
+        self.checked_at = time.monotonic()
+
+    def monitor(self):
+        while True:
+            self.check()
+            time.sleep(REPLICA_CHECK_INTERVAL)
+
+
+class ReplicaSet:
+    """Round-robins reads over the healthy replicas, falling back to the primary."""
+
+    def __init__(self, primary, replicas):
+        self.primary = primary
+        self.replicas = replicas
+        self._cycle = itertools.cycle(replicas) if replicas else None
+        self._lock = threading.Lock()
+        self._monitor_pid = None
+
+    def start_monitors(self):
+        """Starts the health-check threads of this process; threads do not survive a fork, so once per pid."""
+        with self._lock:
+            if self._monitor_pid == os.getpid():
+                return
+            self._monitor_pid = os.getpid()
+        for replica in self.replicas:
+            threading.Thread(target=replica.monitor, name=f"{replica.name}-monitor", daemon=True).start()
+
+    def choose(self):
+        if not self.replicas:
+            return self.primary
+        if self._monitor_pid != os.getpid():
+            self.start_monitors()
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = next(self._cycle)
+                if replica.healthy:
+                    return replica.engine
+        return self.primary
+
+    def recently_invalidated(self):
+        """Tables whose cached values were invalidated less than REPLICA_MAX_LAG seconds ago."""
+        counters = redis_client.hgetall(ttl_policy.INVALIDATIONS_KEY)
+        if not counters:
+            return set()  # also while Redis is down, when nothing is cached either
+        cutoff = time.time() - REPLICA_MAX_LAG
+        return {field[:-3].decode('utf-8') for field, value in counters.items()
+                if field.endswith(b":at") and float(value) > cutoff}
+
+    def stats(self):
+        """Pool usage of the primary and every replica, plus replica health and lag."""
+        result = {"primary": pool_stats(self.primary)}
+        for replica in self.replicas:
+            result[replica.name] = {**pool_stats(replica.engine), "healthy": replica.healthy, "lag": replica.lag}
+        return result
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if method is not None:
+            stats[name] = method()
+    return stats
+
+
+def create_replica_engine(url):
+    connect_args = {"connect_timeout": REPLICA_CONNECT_TIMEOUT} if url.startswith("mysql") else {}
+    return create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+
+
+replicas = ReplicaSet(primary_engine, [
+    Replica(f"replica{i}", create_replica_engine(url)) for i, url in enumerate(DATABASE_REPLICA_URLS)
+])
+
+
+class RoutingSession(Session):
+    """
+    Session that reads from a replica and writes to the primary. The replica is chosen once per
+    session so every read in a request sees the same snapshot; flushes and explicit INSERT/UPDATE/DELETE
+    statements always go to the primary. If the replica's connection fails, the session moves to the
+    primary and retries the statement, unless it has already written. A session that reads a recently
+    invalidated table moves to the primary for the rest of its reads.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.info["wrote"] = True
+            return replicas.primary
+        if "replica_engine" not in self.info:
+            self.info["replica_engine"] = replicas.choose()
+        engine = self.info["replica_engine"]
+        if engine is not replicas.primary and _tables(mapper, clause) & self._recently_invalidated():
+            engine = self.info["replica_engine"] = replicas.primary
+        return engine
+
+    def _recently_invalidated(self):
+        """replicas.recently_invalidated(), read once per session."""
+        if "recently_invalidated" not in self.info:
+            self.info["recently_invalidated"] = replicas.recently_invalidated()
+        return self.info["recently_invalidated"]
+
+    def execute(self, *args, **kwargs):
+        try:
+            return super().execute(*args, **kwargs)
+        except DBAPIError:
+            engine = self.info.get("replica_engine")
+            replica = next((replica for replica in replicas.replicas if replica.engine is engine), None)
+            # Only connection failures mark a replica unhealthy (Replica._on_error); other errors,
+            # e.g. a statement timeout, are not retried.
+            if replica is None or replica.healthy or self.info.get("wrote"):
+                raise
+            logger.warning(f"Retrying a read on the primary after replica {replica.name} failed")
+            self.rollback()
+            self.info["replica_engine"] = replicas.primary
+            return super().execute(*args, **kwargs)
+
+
+def _tables(mapper, clause):
+    """Names of the tables a read selects from, as far as get_bind() can tell."""
+    if mapper is not None:
+        return {table.name for table in mapper.tables}
+    froms = clause.get_final_froms() if hasattr(clause, "get_final_froms") else []
+    return {from_.name for from_ in froms if hasattr(from_, "name")}
+
+
+# Use ReadSession() in read-only handlers and WriteSession() wherever rows are written.
+ReadSession = sessionmaker(class_=RoutingSession)
+WriteSession = sessionmaker(bind=primary_engine)
@@ -1,19 +1,233 @@
+import logging
 import os
+import threading
+import time
 
 import redis
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+logger = logging.getLogger(__name__)
+
 MYSQL_HOST = os.getenv("MYSQL_HOST", "mysql")
 MYSQL_USER = os.getenv("MYSQL_USER", "root")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "Liberty10")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "Plague_Rat_Character")
+# Overrides the MySQL settings above, e.g. sqlite:///benchmarks/bench.db for local benchmarks.
+DATABASE_URL = os.getenv(
+    "DATABASE_URL", f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{3306}/{MYSQL_DATABASE}')
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
+# Redis pool and failure handling. Timeouts are in seconds and deliberately short:
+# a slow cache is worse than no cache, because the routes can always fall back to MySQL.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 0.2))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 0.2))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.2))
+REDIS_BREAKER_THRESHOLD = int(os.getenv("REDIS_BREAKER_THRESHOLD", 5))
+REDIS_BREAKER_COOLDOWN = float(os.getenv("REDIS_BREAKER_COOLDOWN", 30))
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures and short-circuits calls for `cooldown` seconds.
+    Once the cool-down has elapsed a single trial call is let through; its outcome closes or
+    re-opens the breaker.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Half-open: restart the window so only this caller probes Redis.
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Redis circuit opened after {self.failures} failures, "
+                                   f"skipping Redis for {self.cooldown}s")
+                self.opened_at = time.monotonic()
+
+
+_UNAVAILABLE = object()
+
+_GET_FIRST = """
+for i, key in ipairs(KEYS) do
+    local value = redis.call('GET', key)
+    if value then
+        return {i, value}
+    end
+end
+return {}
+"""
+
+
+class ManagedRedis:
+    """
+    Redis client wrapper that turns Redis outages into cache misses.
+    Every command goes through the circuit breaker; connection errors and timeouts are logged
+    and reported as `default` (None for reads) so callers fall back to MySQL instead of failing.
+    Commands without an explicit wrapper are proxied the same way.
+    """
+
+    _errors = (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
+
+    def __init__(self, pool, breaker):
+        self.pool = pool
+        self.breaker = breaker
+        self.client = redis.Redis(connection_pool=pool)
+        # Callables invoked as listener(key, value, ok) after every get(), e.g. to track hot keys.
+        # `ok` is False when Redis was unavailable and the None value is not a real miss.
+        self.listeners = []
+        # Callables invoked as listener(command, seconds, ok) after every round trip to Redis.
+        self.command_listeners = []
+        self._get_first = None
+
+    def _guard(self, func, *args, default=None, **kwargs):
+        if not self.breaker.allow():
+            return default
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except self._errors as e:
+            self.breaker.record_failure()
+            self._notify_command(func, start, False)
+            logger.error(f"Error talking to Redis: {e}")
+            return default
+        self.breaker.record_success()
+        self._notify_command(func, start, True)
+        return result
+
+    def _notify_command(self, func, start, ok):
+        if self.command_listeners:
+            elapsed = time.perf_counter() - start
+            for listener in self.command_listeners:
+                listener(func.__name__, elapsed, ok)
+
+    def get(self, key):
+        value = self._guard(self.client.get, key, default=_UNAVAILABLE)
+        ok = value is not _UNAVAILABLE
+        if not ok:
+            value = None
+        for listener in self.listeners:
+            listener(key, value, ok)
+        return value
+
+    def get_first(self, *keys):
+        """
+        Returns (key, value) for the first of `keys` that exists, or (None, None), in one round trip.
+        Listeners see the last key, which callers pass as the canonical one, e.g. (variant, original).
+        """
+        if self._get_first is None or self._get_first.registered_client is not self.client:
+            self._get_first = self.client.register_script(_GET_FIRST)  # EVALSHA, loading it on first use
+
+        def get_first():
+            return self._get_first(keys=list(keys))
+        found = self._guard(get_first, default=_UNAVAILABLE)
+        ok = found is not _UNAVAILABLE
+        key, value = (keys[found[0] - 1], found[1]) if ok and found else (None, None)
+        for listener in self.listeners:
+            listener(keys[-1], value, ok)
+        return key, value
+
+    def set(self, key, value, ex=None, nx=False):
+        return self._guard(self.client.set, key, value, ex=ex, nx=nx, default=False)
+
+    def delete(self, *keys):
+        if not keys:
+            return 0
+        return self._guard(self.client.delete, *keys, default=0)
+
+    def mget(self, keys):
+        """Fetches several keys in one round trip; missing or unreachable keys come back as None."""
+        keys = list(keys)
+        if not keys:
+            return []
+        return self._guard(self.client.mget, keys, default=[None] * len(keys))
+
+    def set_many(self, mapping, ex=None):
+        """Stores every key/value pair of `mapping` with a single pipelined round trip."""
+        if not mapping:
+            return True
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.set(key, value, ex=ex)
+        return self.execute(pipe, default=False) is not False
+
+    def pipeline(self, transaction=False):
+        return self.client.pipeline(transaction=transaction)
+
+    def execute(self, pipe, default=None):
+        """Executes a pipeline obtained from `pipeline()` behind the circuit breaker."""
+        try:
+            return self._guard(pipe.execute, default=default)
+        finally:
+            pipe.reset()
+
+    def pool_stats(self):
+        """Returns the connection pool's size and how many of its connections are idle or checked out."""
+        # BlockingConnectionPool keeps every connection it created in _connections and parks idle
+        # ones in its `pool` queue, padded with None placeholders for connections not yet created.
+        connections = getattr(self.pool, "_connections", [])
+        queue = getattr(self.pool, "pool", None)
+        idle = sum(1 for connection in queue.queue if connection) if queue is not None else 0
+        return {
+            "max_connections": self.pool.max_connections,
+            "created": len(connections),
+            "idle": idle,
+            "in_use": len(connections) - idle,
+        }
+
+    def ping(self):
+        return bool(self._guard(self.client.ping, default=False))
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+        if not callable(command):
+            return command
+
+        def guarded(*args, **kwargs):
+            return self._guard(command, *args, **kwargs)
+        return guarded
+
+
+redis_pool = redis.BlockingConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    db=0,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+    socket_connect_timeout=REDIS_CONNECT_TIMEOUT,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+    socket_keepalive=True,
+    health_check_interval=30,
+)
+redis_client = ManagedRedis(redis_pool, CircuitBreaker(REDIS_BREAKER_THRESHOLD, REDIS_BREAKER_COOLDOWN))
 
-engine = create_engine(f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{3306}/{MYSQL_DATABASE}')
+engine = create_engine(DATABASE_URL)
 Base = declarative_base()
-Session = sessionmaker(bind=engine)
\ No newline at end of file
+Session = sessionmaker(bind=engine)
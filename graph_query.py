@@ -0,0 +1,262 @@
+"""
+Batched graph queries over the models and relationships in models.py, served at POST /query.
+
+A query names an entity type and its IDs, plus the relationships to follow, nested to any depth:
+
+    {"entity": "colony", "ids": [1, 2],
+     "include": {"plague_rats": {"fields": ["rat_id", "species"],
+                                 "include": {"plague": {"include": {"severity": {}}}}}}}
+
+Entity types are the detail key prefixes of cache_keys.DETAIL_PREFIXES ("colony", "plague_rat", ...),
+and composite IDs are lists in key order (e.g. [3, 12] for a colony_rat). Relationships are the
+relationship() attributes of the models ("plague_rats", "plague", "rats", ...). Each node is the row's
+serialize() dict plus one entry per followed relationship: an object or null for to-one relationships,
+a list for to-many ones. "fields" limits the columns returned for a node.
+
+The resolver works level by level, in the style of DataLoader. It first collects every lookup a level
+needs, deduplicates them and then issues one batch per entity type. To-one lookups and the root IDs
+are read from the per-entity cache ("colony:7", as the detail routes cache it) with one MGET. Only the
+misses go to MySQL, in a single IN query, and the rows found are written back to the cache. To-many
+lookups are one IN query on the foreign key per relationship, and their rows prime the cache too. A
+graph therefore costs O(depth) round trips instead of O(nodes). Stats include the live buffered values,
+as on /stats/<player_id>.
+
+Usage:
+    curl -X POST localhost:5000/query -H 'Content-Type: application/json' \\
+         -d '{"entity": "player", "ids": [1, 2], "include": {"stats": {}, "current_colony": {}}}'
+"""
+import json
+import logging
+import os
+
+from sqlalchemy import inspect, tuple_
+from sqlalchemy.orm import MANYTOONE
+
+import cache_keys
+import cache_tags
+import negative_cache
+import stats_buffer
+from db_utils import redis_client
+from models import Stats
+
+logger = logging.getLogger(__name__)
+
+GRAPH_MAX_IDS = int(os.getenv("GRAPH_MAX_IDS", 1000))  # root IDs per query
+GRAPH_MAX_DEPTH = int(os.getenv("GRAPH_MAX_DEPTH", 6))  # nested includes per query
+GRAPH_MAX_NODES = int(os.getenv("GRAPH_MAX_NODES", 50000))  # rows per response
+
+ENTITIES = dict(cache_keys.DETAIL_PREFIXES)
+PREFIXES = {model: prefix for prefix, model in ENTITIES.items()}
+
+
+class QueryError(ValueError):
+    pass
+
+
+def relationships(model):
+    """The relationships of `model` a query can follow: those joining on one foreign key column."""
+    return {relation.key: relation for relation in inspect(model).relationships
+            if relation.secondary is None and len(relation.local_remote_pairs) == 1}
+
+
+class Node:
+    """One validated level of a query: the model, the fields to return and the relationships to follow."""
+
+    def __init__(self, model, spec, depth=0):
+        if not isinstance(spec, dict):
+            raise QueryError(f"the query for '{model.__tablename__}' must be an object")
+        if depth > GRAPH_MAX_DEPTH:
+            raise QueryError(f"queries can be at most {GRAPH_MAX_DEPTH} levels deep")
+        self.model = model
+        self.fields = spec.get("fields")
+        if self.fields is not None:
+            columns = {column.key for column in inspect(model).columns}
+            if not isinstance(self.fields, list) or not all(field in columns for field in self.fields):
+                raise QueryError(f"'fields' for '{model.__tablename__}' must be a list of: {', '.join(sorted(columns))}")
+        include = spec.get("include") or {}
+        if not isinstance(include, dict):
+            raise QueryError(f"'include' for '{model.__tablename__}' must be an object")
+        available = relationships(model)
+        self.include = {}
+        for name, child in include.items():
+            if name not in available:
+                raise QueryError(f"'{model.__tablename__}' has no relationship '{name}'; "
+                                 f"expected one of: {', '.join(sorted(available))}")
+            relation = available[name]
+            self.include[name] = (relation, Node(relation.mapper.class_, child, depth + 1))
+
+    def output(self, row):
+        """A copy of the serialized `row` to attach the included relationships to."""
+        if self.fields is None:
+            return dict(row)
+        return {field: row.get(field) for field in self.fields}
+
+
+def parse(query):
+    """Validates a query and returns (root Node, list of primary-key tuples); raises QueryError."""
+    if not isinstance(query, dict):
+        raise QueryError("the query must be a JSON object")
+    model = ENTITIES.get(query.get("entity"))
+    if model is None:
+        raise QueryError(f"'entity' must be one of: {', '.join(sorted(ENTITIES))}")
+    ids = query.get("ids")
+    if not isinstance(ids, list) or not ids:
+        raise QueryError("'ids' must be a non-empty list")
+    if len(ids) > GRAPH_MAX_IDS:
+        raise QueryError(f"at most {GRAPH_MAX_IDS} ids per query")
+    width = len(cache_keys.primary_key_columns(model))
+    pks = []
+    for value in ids:
+        pk = tuple(value) if isinstance(value, list) else (value,)
+        if len(pk) != width or not all(isinstance(part, int) and not isinstance(part, bool) for part in pk):
+            raise QueryError(f"ids of '{query['entity']}' must be " +
+                             ("integers" if width == 1 else f"lists of {width} integers"))
+        pks.append(pk)
+    return Node(model, {key: value for key, value in query.items() if key in ("fields", "include")}), pks
+
+
+def statement_budget(query):
+    """
+    Most SQL statements execute() issues for `query`: one for the roots plus one per followed
+    relationship, whatever the number of rows. 0 for an invalid query.
+    """
+    try:
+        root, _ = parse(query)
+    except QueryError:
+        return 0
+    budget, nodes = 1, [root]
+    while nodes:
+        node = nodes.pop()
+        budget += len(node.include)
+        nodes.extend(child for _, child in node.include.values())
+    return budget
+
+
+class Loader:
+    """
+    Per-query cache of serialized rows by (model, primary key), filled in batches. Each row is looked
+    up at most once per query, however many parents reference it.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.rows = {}
+
+    def load(self, model, pks):
+        """Returns {pk: serialized row or None} for primary-key tuples, with one MGET and at most one query."""
+        wanted = [pk for pk in dict.fromkeys(pks) if (model, pk) not in self.rows]
+        prefix = PREFIXES.get(model)
+        if wanted and prefix is not None:
+            cached = redis_client.mget(cache_keys.detail_key(prefix, *pk) for pk in wanted)
+            found = []
+            for pk, value in zip(wanted, cached):
+                if value == negative_cache.MISSING:
+                    self.rows[model, pk] = None
+                elif value is not None:
+                    self.rows[model, pk] = json.loads(value)
+                    found.append(pk)
+            self._overlay(model, found)
+            wanted = [pk for pk in wanted if (model, pk) not in self.rows]
+        if wanted:
+            columns = cache_keys.primary_key_columns(model)
+            if len(columns) == 1:
+                condition = columns[0].in_([pk[0] for pk in wanted])
+            else:
+                condition = tuple_(*columns).in_(wanted)
+            self._fetch(model, condition)
+            for pk in wanted:
+                if (model, pk) not in self.rows:
+                    self.rows[model, pk] = None
+                    if prefix is not None:
+                        negative_cache.remember(cache_keys.detail_key(prefix, *pk))
+        return {pk: self.rows[model, pk] for pk in pks}
+
+    def children(self, model, column, values):
+        """Returns {value: [serialized rows]} for the rows of `model` whose `column` is in `values`, in one query."""
+        grouped = {value: [] for value in values}
+        for row in self._fetch(model, column.in_(list(grouped))):
+            grouped[row[column.key]].append(row)
+        return grouped
+
+    def _fetch(self, model, condition):
+        """Runs one query, remembers and caches its rows, and returns them (as already loaded, if they were)."""
+        columns = cache_keys.primary_key_columns(model)
+        prefix = PREFIXES.get(model)
+        rows, new, payloads = [], [], {}
+        for instance in self.session.query(model).filter(condition).order_by(*columns).all():
+            row = instance.serialize()
+            pk = tuple(row[column.key] for column in columns)
+            if self.rows.get((model, pk)) is None:
+                self.rows[model, pk] = row
+                new.append(pk)
+                if prefix is not None:
+                    payloads[cache_keys.detail_key(prefix, *pk)] = json.dumps(row)
+            rows.append(pk)
+        cache_tags.store_many(payloads)
+        self._overlay(model, new)
+        return [self.rows[model, pk] for pk in rows]
+
+    def _overlay(self, model, pks):
+        """Replaces stored stats with the live buffered ones, which /stats/<player_id> also prefers."""
+        if model is Stats and pks:
+            for player_id, live in stats_buffer.get_many(pk[0] for pk in pks).items():
+                self.rows[model, (player_id,)] = live
+
+
+def execute(session, query):
+    """Resolves a query; returns {"data": [root nodes], "missing": [root ids that do not exist]}."""
+    root, pks = parse(query)
+    loader = Loader(session)
+    found = loader.load(root.model, pks)
+    pairs = [(found[pk], root.output(found[pk])) for pk in pks if found[pk] is not None]
+    missing = [pk[0] if len(pk) == 1 else list(pk) for pk in pks if found[pk] is None]
+    data = [output for _, output in pairs]
+    nodes = len(pairs)
+
+    level = [(root, pairs)]
+    while level:
+        # Collect the whole level's lookups first: to-one by target model, to-many by foreign key column.
+        to_one, to_many = {}, {}
+        for node, items in level:
+            for relation, _ in node.include.values():
+                local, remote = relation.local_remote_pairs[0]
+                values = {row[local.key] for row, _ in items if row.get(local.key) is not None}
+                if _by_primary_key(relation):
+                    to_one.setdefault(relation.mapper.class_, set()).update((value,) for value in values)
+                else:
+                    to_many.setdefault((relation.mapper.class_, remote), set()).update(values)
+        loaded = {model: loader.load(model, list(pks)) for model, pks in to_one.items()}
+        loaded.update({(model, column): loader.children(model, column, list(values))
+                       for (model, column), values in to_many.items()})
+
+        next_level = []
+        for node, items in level:
+            for name, (relation, child) in node.include.items():
+                local, remote = relation.local_remote_pairs[0]
+                child_items = []
+                for row, output in items:
+                    value = row.get(local.key)
+                    if value is None:
+                        targets = []
+                    elif _by_primary_key(relation):
+                        target = loaded[relation.mapper.class_][(value,)]
+                        targets = [target] if target is not None else []
+                    else:
+                        targets = loaded[relation.mapper.class_, remote][value]
+                    outputs = [child.output(target) for target in targets]
+                    output[name] = outputs if relation.uselist else (outputs[0] if outputs else None)
+                    child_items.extend(zip(targets, outputs))
+                nodes += len(child_items)
+                if nodes > GRAPH_MAX_NODES:
+                    raise QueryError(f"the query returns more than {GRAPH_MAX_NODES} rows")
+                if child.include and child_items:
+                    next_level.append((child, child_items))
+        level = next_level
+
+    return {"data": data, "missing": missing}
+
+
+def _by_primary_key(relation):
+    """True for to-one relationships that point at a single-column primary key, which go through load()."""
+    columns = cache_keys.primary_key_columns(relation.mapper.class_)
+    return relation.direction is MANYTOONE and len(columns) == 1 and columns[0] is relation.local_remote_pairs[0][1]
@@ -0,0 +1,22 @@
+"""
+Gunicorn settings for serving the API, used by the Dockerfile:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The workers are gevent workers, so an open /live stream (live_events.py) or a long /admin/export
+costs a greenlet, not a worker. Gunicorn's gevent worker monkey-patches the standard library when the
+worker starts, before it imports the app. That covers everything the app waits on: PyMySQL and
+redis-py are pure Python and use the patched sockets, and the background threads, locks, queues and
+sleeps of the other modules become cooperative. The app must therefore not be preloaded. Otherwise
+models.py would create its engine, and its locks, in the master before anything is patched.
+CPU-bound work, such as building the world snapshot, still blocks the worker it runs in.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+worker_class = "gevent"
+workers = int(os.getenv("GUNICORN_WORKERS", 2))  # processes; each serves up to worker_connections clients
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))  # concurrent requests and streams per worker
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))  # seconds a worker may block its event loop
+preload_app = False  # see above: patching must come before the app is imported
+accesslog = "-"
@@ -0,0 +1,264 @@
+"""
+Pushes new and updated GameEvent, Battle and PlagueAffected rows to clients over Server-Sent Events,
+so they do not have to poll /game_events or /battles/<id>.
+
+Writers publish every committed change on the Redis channel LIVE_CHANNEL. ORM sessions do this
+through the session hooks below; bulk Core inserts call publish_rows(). Each process runs one
+listener thread that subscribes to the channel and fans messages out to its local subscribers
+through bounded in-memory queues. A slow client cannot hold up the others: once its queue is full
+it gets an `overflow` event and is disconnected, and should catch up through the REST routes.
+
+    GET /live?colony_id=3&player_id=7&types=game_event,battle
+
+An event matches when its colony or player is in the filters. Without filters, a client gets
+everything. Each stream only waits on its own queue, so under the gevent workers of gunicorn.conf.py
+an open stream costs a greenlet rather than a sync worker. On the threaded development server it
+costs one thread.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import Response, jsonify, request
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from db_routing import WriteSession
+from db_utils import redis, redis_client
+from models import Battle, BattleParticipant, GameEvent, PlagueAffected, PlagueRat
+
+logger = logging.getLogger(__name__)
+
+LIVE_CHANNEL = os.getenv("LIVE_CHANNEL", "live_events")
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", 1000))  # open streams per process
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", 100))  # events buffered per client before it is dropped
+LIVE_HEARTBEAT = float(os.getenv("LIVE_HEARTBEAT", 15))  # seconds between keep-alive comments
+
+PUBLISHED = {model.__tablename__: model for model in (GameEvent, Battle, PlagueAffected)}
+
+
+def _audience(session, instance):
+    """Returns the (colony_ids, player_ids) an event about `instance` concerns."""
+    if isinstance(instance, GameEvent):
+        return [instance.colony_id], [instance.player_id]
+    if isinstance(instance, Battle):
+        colonies = [participant.colony_id for participant in instance.participants]
+        return [instance.winner_colony_id, *colonies], []
+    if instance.entity_type == "player":
+        return [], [instance.entity_id]
+    rat = session.get(PlagueRat, instance.entity_id)
+    return [rat.colony_id if rat is not None else None], []
+
+
+def _message(table, row, colony_ids, player_ids):
+    return json.dumps({
+        "type": table,
+        "row": row,
+        "colony_ids": sorted({colony_id for colony_id in colony_ids if colony_id is not None}),
+        "player_ids": sorted({player_id for player_id in player_ids if player_id is not None}),
+    })
+
+
+def _publish(messages):
+    if not messages:
+        return
+    pipe = redis_client.pipeline()
+    for message in messages:
+        pipe.publish(LIVE_CHANNEL, message)
+    redis_client.execute(pipe)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    messages = session.info.setdefault("live_events", [])
+    for instance in [*session.new, *session.dirty]:
+        table = getattr(instance, "__tablename__", None)
+        if table not in PUBLISHED:
+            continue
+        if instance in session.dirty and not session.is_modified(instance, include_collections=False):
+            continue
+        messages.append(_message(table, instance.serialize(), *_audience(session, instance)))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    _publish(session.info.pop("live_events", None))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    session.info.pop("live_events", None)
+
+
+def _audiences(model, rows):
+    """
+    The (colony_ids, player_ids) of every row written with a Core insert, as _audience() finds them for
+    ORM instances: with one IN query for the participants of battles or the colonies of rats.
+    """
+    if model is GameEvent:
+        return [([row.get("colony_id")], [row.get("player_id")]) for row in rows]
+    session = WriteSession()  # the primary: the rows were just committed
+    try:
+        if model is Battle:
+            participants = {}
+            for battle_id, colony_id in session.execute(
+                    select(BattleParticipant.battle_id, BattleParticipant.colony_id)
+                    .where(BattleParticipant.battle_id.in_({row["battle_id"] for row in rows}))):
+                participants.setdefault(battle_id, []).append(colony_id)
+            return [([row.get("winner_colony_id"), *participants.get(row["battle_id"], [])], []) for row in rows]
+        rat_ids = {row["entity_id"] for row in rows if row.get("entity_type") == "rat"}
+        colonies = dict(session.execute(select(PlagueRat.rat_id, PlagueRat.colony_id)
+                                        .where(PlagueRat.rat_id.in_(rat_ids))).all()) if rat_ids else {}
+        return [([], [row.get("entity_id")]) if row.get("entity_type") == "player"
+                else ([colonies.get(row.get("entity_id"))], []) for row in rows]
+    finally:
+        session.close()
+
+
+def publish_rows(model, rows, audiences=None):
+    """
+    Publishes rows written with a Core insert (dicts of column values) after their transaction committed.
+    `audiences` lists the (colony_ids, player_ids) of each row when the caller already knows them;
+    otherwise they are looked up.
+    """
+    if model.__tablename__ not in PUBLISHED or not rows:
+        return
+    if audiences is None:
+        audiences = _audiences(model, rows)
+    messages = []
+    for row, audience in zip(rows, audiences):
+        row = {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+        messages.append(_message(model.__tablename__, row, *audience))
+    _publish(messages)
+
+
+class Subscription:
+    def __init__(self, types, colony_ids, player_ids):
+        self.types = types
+        self.colony_ids = colony_ids
+        self.player_ids = player_ids
+        self.queue = queue.Queue(maxsize=LIVE_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, message):
+        if self.types and message["type"] not in self.types:
+            return False
+        if not self.colony_ids and not self.player_ids:
+            return True
+        return (not self.colony_ids.isdisjoint(message["colony_ids"])
+                or not self.player_ids.isdisjoint(message["player_ids"]))
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+
+class LiveHub:
+    """Per-process fan-out: one Redis subscriber thread feeding every local Subscription."""
+
+    def __init__(self):
+        self.subscriptions = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, types=None, colony_ids=(), player_ids=()):
+        with self._lock:
+            if len(self.subscriptions) >= LIVE_MAX_SUBSCRIBERS:
+                return None
+            subscription = Subscription(set(types or ()), set(colony_ids), set(player_ids))
+            self.subscriptions.add(subscription)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name="live-events", daemon=True)
+                self._thread.start()
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions.discard(subscription)
+
+    def dispatch(self, data):
+        message = json.loads(data)
+        with self._lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            if not subscription.overflowed and subscription.matches(message):
+                subscription.offer(message)
+
+    def _listen(self):
+        delay = 1
+        while True:
+            pubsub = redis_client.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(LIVE_CHANNEL)
+                delay = 1
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self.dispatch(message["data"])
+            except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+                logger.error(f"Live event subscription lost, retrying in {delay}s: {e}")
+            except Exception as e:
+                logger.error(f"Error dispatching live events: {e}")
+            finally:
+                pubsub.close()
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+hub = LiveHub()
+
+
+def _ids(name):
+    try:
+        return {int(value) for values in request.args.getlist(name) for value in values.split(",") if value}
+    except ValueError:
+        raise ValueError(f"{name} must be a comma-separated list of integers")
+
+
+def stream(subscription):
+    """Yields the subscription's events in SSE format, with keep-alive comments while idle."""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                message = subscription.queue.get(timeout=LIVE_HEARTBEAT)
+            except queue.Empty:
+                if subscription.overflowed:
+                    yield "event: overflow\ndata: {}\n\n"
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {message['type']}\ndata: {json.dumps(message['row'])}\n\n"
+            if subscription.overflowed and subscription.queue.empty():
+                yield "event: overflow\ndata: {}\n\n"
+                return
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def live():
+    try:
+        colony_ids, player_ids = _ids("colony_id"), _ids("player_id")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    types = [name for name in request.args.get("types", "").split(",") if name]
+    unknown = [name for name in types if name not in PUBLISHED]
+    if unknown:
+        return jsonify({"error": f"Unknown event types: {', '.join(unknown)}"}), 400
+
+    subscription = hub.subscribe(types, colony_ids, player_ids)
+    if subscription is None:
+        return jsonify({"error": "Too many live subscribers"}), 503
+    return Response(stream(subscription), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def init_app(app):
+    """Registers the GET /live event stream."""
+    app.add_url_rule("/live", "live", live, methods=["GET"])
@@ -0,0 +1,35 @@
+"""
+Point lookups by primary key through prebuilt statements.
+
+session.query(Model).filter_by(pk=...).first() builds a new Query on every call, derives its cache key
+from scratch and adds a LIMIT. get() instead executes one select() per model, built the first time
+it is needed with bound parameters for the primary key columns. SQLAlchemy memoizes the cache key of a
+statement object, so a lookup only binds the values and takes the compiled SQL from the engine's
+compiled cache. On the cache-miss path of the detail routes, the time then goes to the database round
+trip rather than to building SQL.
+
+Usage:
+    python -m benchmarks.point_lookups        # per-model comparison with filter_by().first() and session.get()
+"""
+from sqlalchemy import bindparam, select
+
+import cache_keys
+
+_statements = {}  # model -> (statement, bound parameter names in primary key order)
+
+
+def statement(model):
+    """The prebuilt SELECT of one `model` row by primary key, and the names of its parameters."""
+    prebuilt = _statements.get(model)
+    if prebuilt is None:
+        columns = cache_keys.primary_key_columns(model)
+        names = tuple(f"pk_{column.key}" for column in columns)
+        query = select(model).where(*(column == bindparam(name) for column, name in zip(columns, names)))
+        prebuilt = _statements[model] = (query, names)
+    return prebuilt
+
+
+def get(session, model, *pk):
+    """The `model` row with primary key `pk` (values in column order), or None."""
+    query, names = statement(model)
+    return session.execute(query, dict(zip(names, pk))).scalar_one_or_none()
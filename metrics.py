@@ -0,0 +1,157 @@
+"""
+Prometheus metrics for the request hot path, exposed at /metrics by init_app():
+per-route latency, cache hits/misses/errors per key family, SQL statement counts and timings
+per request, Redis round-trip time and Redis pool utilization, and the database admission queues.
+Metrics are kept per process.
+"""
+import time
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import admission
+from cache_keys import family_of
+from db_routing import pool_stats, replicas
+from db_utils import redis_client
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route template.", ["route", "method", "status"])
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Redis cache reads by key family and result (hit, miss, error).", ["family", "result"])
+DB_QUERIES = Counter(
+    "db_queries_total", "SQL statements executed, by route template.", ["route"])
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "SQL statement latency by route template.", ["route"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "SQL statements issued per request.", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100))
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Time spent in SQL statements per request.", ["route"])
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds", "Redis round-trip time by command.", ["command", "ok"],
+    buckets=(.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25))
+REDIS_POOL_CONNECTIONS = Gauge(
+    "redis_pool_connections", "Redis pool connections by state.", ["state"])
+REDIS_CIRCUIT_OPEN = Gauge(
+    "redis_circuit_open", "1 while the Redis circuit breaker is skipping Redis.")
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "SQLAlchemy pool connections by engine (primary, replicaN) and state.", ["engine", "state"])
+DB_REPLICA_HEALTHY = Gauge(
+    "db_replica_healthy", "1 while a read replica is reachable and within REPLICA_MAX_LAG.", ["engine"])
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds", "Replication lag measured by the last replica health check.", ["engine"])
+DB_ADMISSION_IN_FLIGHT = Gauge(
+    "db_admission_in_flight", "Sessions holding an admission slot, by scope (local, cluster) and kind.", ["scope", "kind"])
+DB_ADMISSION_QUEUE_DEPTH = Gauge(
+    "db_admission_queue_depth", "Requests waiting for an admission slot in this process, by kind.", ["kind"])
+DB_ADMISSION_WAIT = Histogram(
+    "db_admission_wait_seconds", "Time spent waiting for an admission slot, by kind.", ["kind"],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+DB_ADMISSION_REJECTED = Counter(
+    "db_admission_rejected_total", "Requests answered with 503 by the admission control, by kind and reason.",
+    ["kind", "reason"])
+
+NO_ROUTE = "none"  # label for work done outside a request, e.g. the cache refresher
+
+
+def current_route():
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return NO_ROUTE
+
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    g.db_queries = 0
+    g.db_time = 0.0
+
+
+def _finish_request(response):
+    route = current_route()
+    start = g.get("request_start")
+    if start is not None:
+        REQUEST_LATENCY.labels(route, request.method, response.status_code).observe(time.perf_counter() - start)
+    DB_QUERIES_PER_REQUEST.labels(route).observe(g.get("db_queries", 0))
+    DB_TIME_PER_REQUEST.labels(route).observe(g.get("db_time", 0.0))
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    route = current_route()
+    DB_QUERIES.labels(route).inc()
+    DB_QUERY_DURATION.labels(route).observe(elapsed)
+    if has_request_context():
+        g.db_queries = g.get("db_queries", 0) + 1
+        g.db_time = g.get("db_time", 0.0) + elapsed
+
+
+def _handle_error(context):
+    """Drops the start time of a statement that raised, for which after_cursor_execute never runs."""
+    conn = context.connection
+    if conn is not None and context.execution_context is not None and conn.info.get("query_start_time"):
+        conn.info["query_start_time"].pop()
+
+
+def _record_cache_lookup(key, value, ok):
+    if isinstance(key, bytes):
+        key = key.decode('utf-8')
+    result = "error" if not ok else "hit" if value is not None else "miss"
+    CACHE_LOOKUPS.labels(family_of(key), result).inc()
+
+
+def _record_redis_command(command, seconds, ok):
+    REDIS_COMMAND_DURATION.labels(command, str(ok).lower()).observe(seconds)
+
+
+def _record_admission(kind, seconds, reason):
+    DB_ADMISSION_WAIT.labels(kind).observe(seconds)
+    if reason is not None:
+        DB_ADMISSION_REJECTED.labels(kind, reason).inc()
+
+
+def metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Installs the request, SQLAlchemy and Redis hooks and registers the /metrics route."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule("/metrics", "metrics", metrics, methods=["GET"])
+
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+    redis_client.listeners.append(_record_cache_lookup)
+    redis_client.command_listeners.append(_record_redis_command)
+    for state in ("max_connections", "created", "idle", "in_use"):
+        REDIS_POOL_CONNECTIONS.labels(state).set_function(lambda state=state: redis_client.pool_stats()[state])
+    REDIS_CIRCUIT_OPEN.set_function(lambda: int(redis_client.breaker.is_open))
+
+    admission.listeners.append(_record_admission)
+    for kind in admission.KINDS:
+        if admission.local is not None:
+            DB_ADMISSION_IN_FLIGHT.labels("local", kind).set_function(lambda kind=kind: admission.local.in_flight[kind])
+            DB_ADMISSION_QUEUE_DEPTH.labels(kind).set_function(lambda kind=kind: admission.local.waiting[kind])
+        if admission.cluster is not None:
+            DB_ADMISSION_IN_FLIGHT.labels("cluster", kind).set_function(
+                lambda kind=kind: admission.cluster.in_flight()[kind])
+
+    engines = {"primary": replicas.primary, **{replica.name: replica.engine for replica in replicas.replicas}}
+    for name, engine in engines.items():
+        for state in pool_stats(engine):
+            DB_POOL_CONNECTIONS.labels(name, state).set_function(
+                lambda engine=engine, state=state: pool_stats(engine)[state])
+    for replica in replicas.replicas:
+        DB_REPLICA_HEALTHY.labels(replica.name).set_function(lambda replica=replica: int(replica.healthy))
+        DB_REPLICA_LAG.labels(replica.name).set_function(
+            lambda replica=replica: replica.lag if replica.lag is not None else float("nan"))
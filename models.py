@@ -2,11 +2,11 @@ from datetime import time
 from sqlite3 import OperationalError
 
 from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, DECIMAL, \
-    UniqueConstraint
+    UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
-from db_utils import Base, create_engine, MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_DATABASE
+from db_utils import Base, create_engine, DATABASE_URL
 
 #SQLAlchemy Configuration
 MAX_RETRIES = 5
@@ -15,7 +15,7 @@ RETRY_DELAY = 5  # seconds
 engine = None
 for i in range(MAX_RETRIES):
     try:
-        engine = create_engine(f'mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{3306}/{MYSQL_DATABASE}')
+        engine = create_engine(DATABASE_URL)
         engine.connect()
         print("Successfully connected to MySQL!")
         break
@@ -150,8 +150,8 @@ class Achievement(Base):
             'achievement_id': self.achievement_id,
             'achievement_name': self.achievement_name,
             'achievement_description': self.achievement_description,
-            'created_at': self.created_at,
-            'updated_at': self.updated_at
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class Item(Base):
@@ -256,7 +256,7 @@ class Economy(Base):  # Depends on Player and Item
     item_id = Column(Integer, ForeignKey('item.item_id'), nullable=False)
     transaction_type = Column(String(50), nullable=False)
     amount = Column(Integer, nullable=False, default=1)
-    timestamp = Column(DateTime, nullable=False, server_default=func.now())
+    timestamp = Column(DateTime, nullable=False, server_default=func.now(), index=True)  # archive.py cut-off
 
     player = relationship("Player", foreign_keys=[player_id], back_populates="economy_transactions")
     item = relationship("Item", foreign_keys=[item_id], back_populates="economy_transactions")
@@ -276,7 +276,7 @@ class GameEvent(Base):  # Depends on Player and Colony
     event_id = Column(Integer, primary_key=True)
     event_type = Column(String(100), nullable=False)
     description = Column(Text)
-    timestamp = Column(DateTime, nullable=False, server_default=func.now())
+    timestamp = Column(DateTime, nullable=False, server_default=func.now(), index=True)  # archive.py cut-off
     player_id = Column(Integer, ForeignKey('player.player_id'))
     colony_id = Column(Integer, ForeignKey('colony.colony_id'))
 
@@ -312,7 +312,7 @@ class PlayerAchievement(Base):  # Depends on Player and Achievement
             'player_achievement_id': self.player_achievement_id,
             'player_id': self.player_id,
             'achievement_id': self.achievement_id,
-            'granted_at': self.granted_at
+            'granted_at': self.granted_at.isoformat() if self.granted_at else None
         }
 
 class Equipment(Base):
@@ -392,6 +392,9 @@ class ColonyRat(Base):
 
 class PlagueAffected(Base):
     __tablename__ = 'plague_affected'
+    # Serves /players/<id>/infections and /plague_rats/<id>/infections; with recovery_date last,
+    # the active-only view (recovery_date IS NULL) is a range scan on the same index.
+    __table_args__ = (Index('ix_plague_affected_entity_active', 'entity_type', 'entity_id', 'recovery_date'),)
     relation_id = Column(Integer, primary_key=True)
     entity_type = Column(String(50), nullable=False)
     entity_id = Column(Integer, nullable=False)
@@ -474,4 +477,49 @@ class DayNightTime(Base):
             'start_time': self.start_time.isoformat() if self.start_time else None,
             'end_time': self.end_time.isoformat() if self.end_time else None,
             'effect': self.effect,
-        }
\ No newline at end of file
+        }
+
+
+class ChangeLog(Base):  # Written by change_feed.py for /changes
+    __tablename__ = 'change_log'
+    __table_args__ = {'sqlite_autoincrement': True}  # never reuse IDs after prune(), they are client tokens
+    change_id = Column(Integer, primary_key=True, autoincrement=True)
+    table_name = Column(String(64), nullable=False)
+    row_id = Column(String(64), nullable=False)  # primary key values joined with ':'
+    operation = Column(String(10), nullable=False)  # insert, update or delete
+    changed_at = Column(DateTime, nullable=False, server_default=func.now(), index=True)
+
+    def serialize(self):
+        return {
+            'change_id': self.change_id,
+            'table_name': self.table_name,
+            'row_id': self.row_id,
+            'operation': self.operation,
+            'changed_at': self.changed_at.isoformat() if self.changed_at else None,
+        }
+
+
+# Cold tiers of the append-only history tables, filled by archive.py. Same columns and IDs as the
+# online tables, but no foreign keys: archived rows outlive the players and colonies they mention.
+class EconomyArchive(Base):
+    __tablename__ = 'economy_archive'
+    transaction_id = Column(Integer, primary_key=True, autoincrement=False)
+    player_id = Column(Integer, nullable=False)
+    item_id = Column(Integer, nullable=False)
+    transaction_type = Column(String(50), nullable=False)
+    amount = Column(Integer, nullable=False)
+    timestamp = Column(DateTime, nullable=False, index=True)
+
+    serialize = Economy.serialize
+
+
+class GameEventArchive(Base):
+    __tablename__ = 'game_event_archive'
+    event_id = Column(Integer, primary_key=True, autoincrement=False)
+    event_type = Column(String(100), nullable=False)
+    description = Column(Text)
+    timestamp = Column(DateTime, nullable=False, index=True)
+    player_id = Column(Integer)
+    colony_id = Column(Integer)
+
+    serialize = GameEvent.serialize
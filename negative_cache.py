@@ -0,0 +1,204 @@
+"""
+Negative caching for the detail routes, plus an optional per-table existence filter.
+
+When a detail route finds no row, it stores MISSING under the row's cache key for NEGATIVE_CACHE_TTL
+seconds, so repeated requests for the same unknown ID are answered from Redis. These entries carry the
+tag "<table>:missing", which every cache_tags.invalidate_rows() call on the table drops. A
+newly inserted row is therefore never hidden behind a stale 404, even when its ID was not known to
+the writer, as with bulk Core inserts.
+
+Tables named in EXISTENCE_FILTER_TABLES also get a Bloom filter of their primary keys, kept in Redis as
+a bitmap (exists:<table>). An ID the filter has never seen is answered with 404 without a database
+query, so scanning ID ranges costs no MySQL load. Rows inserted through the ORM are added to the filter
+when their transaction commits. The filter also records a high water, and IDs above it are always
+looked up. The rebuild reads the highest ID from the primary first, waits EXISTENCE_FILTER_SETTLE
+seconds so that transactions that already hold lower autoincrement IDs commit (and replicas catch up),
+and only then scans the IDs up to it. Rows inserted later get higher IDs, so autoincrement rows from
+Core inserts are never rejected, whichever code path wrote them. Rows inserted with explicit IDs below
+the high water outside the ORM (benchmarks/datagen.py) need a rebuild before they are found. Deleted
+rows stay in the filter until the next rebuild and are then simply looked up. For game_event and
+economy, the rebuild also reads the IDs of their archive tables, so archived rows stay reachable by ID
+(see archive.py). Without a built filter, or while Redis is unavailable, every ID is looked up.
+
+Usage:
+    python negative_cache.py rebuild [table ...]    # (re)build the filters, e.g. from cron
+"""
+import hashlib
+import logging
+import os
+import sys
+import time
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+import archive
+import cache_keys
+import cache_tags
+from cache_keys import DETAIL_PREFIXES
+from db_routing import ReadSession, WriteSession
+from db_utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", 30))  # seconds a 404 is remembered, 0 disables
+EXISTENCE_FILTER_TABLES = [table.strip() for table in
+                           os.getenv("EXISTENCE_FILTER_TABLES", "").split(",") if table.strip()]
+EXISTENCE_FILTER_BITS = int(os.getenv("EXISTENCE_FILTER_BITS", 1 << 23))  # bits per table (1 MiB), ~2% false
+                                                                            # positives at 1M rows
+EXISTENCE_FILTER_HASHES = int(os.getenv("EXISTENCE_FILTER_HASHES", 6))  # bits set per ID
+EXISTENCE_FILTER_BATCH_SIZE = int(os.getenv("EXISTENCE_FILTER_BATCH_SIZE", 10000))  # IDs read per fetch on rebuild
+EXISTENCE_FILTER_SETTLE = float(os.getenv("EXISTENCE_FILTER_SETTLE", 10))  # seconds, longer than any insert
+                                                                           # transaction plus replica lag
+
+MISSING = b"\x00missing"  # cannot be mistaken for a JSON payload
+
+# Tables with a single integer primary key can be filtered.
+FILTERABLE = {model.__tablename__: model for model in DETAIL_PREFIXES.values()
+              if len(cache_keys.primary_key_columns(model)) == 1}
+
+for _table in EXISTENCE_FILTER_TABLES:
+    if _table not in FILTERABLE:
+        logger.warning(f"Ignoring EXISTENCE_FILTER_TABLES entry '{_table}': not a table with a single-column key")
+FILTERED = {table: FILTERABLE[table] for table in EXISTENCE_FILTER_TABLES if table in FILTERABLE}
+
+
+def filter_key(table):
+    return f"exists:{table}"
+
+
+def high_water_key(table):
+    return f"exists:{table}:max"
+
+
+def remember(key):
+    """Caches the absence of the row behind detail key `key`."""
+    if NEGATIVE_CACHE_TTL <= 0:
+        return False
+    parsed = cache_keys.parse_detail_key(key)
+    if parsed is None:
+        return False
+    return cache_tags.store(key, MISSING, ex=NEGATIVE_CACHE_TTL, tags=[cache_keys.missing_tag(parsed[0])],
+                            stale=False)
+
+
+def _positions(pk):
+    digest = hashlib.blake2b(str(pk).encode('utf-8'), digest_size=16).digest()
+    first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+    return [(first + i * second) % EXISTENCE_FILTER_BITS for i in range(EXISTENCE_FILTER_HASHES)]
+
+
+def might_exist(model, pk):
+    """False only if `pk` is certainly not in `model`'s table; True whenever the filter cannot tell."""
+    table = model.__tablename__
+    if table not in FILTERED:
+        return True
+    pipe = redis_client.pipeline()
+    pipe.get(high_water_key(table))
+    pipe.exists(filter_key(table))  # an evicted bitmap would read as all zeros
+    for position in _positions(pk):
+        pipe.getbit(filter_key(table), position)
+    results = redis_client.execute(pipe)
+    if results is None or results[0] is None or not results[1] or pk > int(results[0]):
+        return True
+    return all(results[2:])
+
+
+def is_missing(cached, model, *pk):
+    """
+    True when a detail route can answer 404 without the database: `cached` (the value read from the
+    row's cache key) is a negative entry, or nothing is cached and the existence filter rules `pk` out.
+    """
+    if cached is not None:
+        return cached == MISSING
+    return len(pk) == 1 and not might_exist(model, pk[0])
+
+
+def add(model, pks):
+    """Adds primary keys to `model`'s filter, if the table has one."""
+    table = model.__tablename__
+    if table not in FILTERED or not pks:
+        return
+    pipe = redis_client.pipeline()
+    for pk in pks:
+        for position in _positions(pk):
+            pipe.setbit(filter_key(table), position, 1)
+    redis_client.execute(pipe)
+
+
+def rebuild(model):
+    """
+    Builds `model`'s filter from every primary key in the table, and in its archive table if it has one,
+    and swaps it in; returns the row count.
+    """
+    table = model.__tablename__
+    tiers = [tier for tier in (model, archive.TIERS.get(model)) if tier is not None]
+    session = WriteSession()
+    try:
+        # An archived row keeps its ID, so one high water covers both tiers.
+        high_water = max(session.execute(select(func.max(cache_keys.primary_key_columns(tier)[0]))).scalar() or 0
+                         for tier in tiers)
+    finally:
+        session.close()
+    time.sleep(EXISTENCE_FILTER_SETTLE)
+
+    bits = bytearray(EXISTENCE_FILTER_BITS // 8 + 1)
+    count = 0
+    session = ReadSession()
+    try:
+        # Online before archive: a row archived meanwhile is then still read in one of the two.
+        for tier in tiers:
+            pk_column = cache_keys.primary_key_columns(tier)[0]
+            for pk in session.execute(select(pk_column).where(pk_column <= high_water)
+                                      .execution_options(yield_per=EXISTENCE_FILTER_BATCH_SIZE)).scalars():
+                for position in _positions(pk):
+                    bits[position >> 3] |= 0x80 >> (position & 7)  # Redis numbers bits from the high end
+                count += 1
+    finally:
+        session.close()
+
+    building = f"{filter_key(table)}:building"
+    if not redis_client.set(building, bytes(bits)):
+        raise RuntimeError(f"Could not store the existence filter for {table}")
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.rename(building, filter_key(table))
+    pipe.set(high_water_key(table), high_water)
+    if redis_client.execute(pipe) is None:
+        raise RuntimeError(f"Could not store the existence filter for {table}")
+    logger.info(f"Built the existence filter for {table}: {count} rows up to ID {high_water}")
+    return count
+
+
+@event.listens_for(Session, "after_flush")
+def _collect(session, flush_context):
+    for instance in session.new:
+        table = getattr(instance, "__tablename__", None)
+        if table in FILTERED:
+            pk = cache_keys.primary_key_columns(FILTERED[table])[0]
+            session.info.setdefault("existence_filter", []).append((table, getattr(instance, pk.key)))
+
+
+@event.listens_for(Session, "after_commit")
+def _add_committed(session):
+    by_table = {}
+    for table, pk in session.info.pop("existence_filter", []):
+        by_table.setdefault(table, []).append(pk)
+    for table, pks in by_table.items():
+        add(FILTERED[table], pks)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard(session, previous_transaction):
+    session.info.pop("existence_filter", None)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:2] != ["rebuild"]:
+        raise SystemExit("usage: python negative_cache.py rebuild [table ...]")
+    tables = sys.argv[2:] or list(FILTERED)
+    unknown = [table for table in tables if table not in FILTERED]
+    if unknown:
+        raise SystemExit(f"not in EXISTENCE_FILTER_TABLES: {', '.join(unknown)}")
+    for table in tables:
+        print(f"{table}: {rebuild(FILTERED[table])}")
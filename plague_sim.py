@@ -0,0 +1,271 @@
+"""
+Plague spread simulation. Loads every player and plague rat with a position, together with the
+current PlagueAffected rows, into NumPy arrays, and advances the spread of every plague one tick at
+a time without per-entity Python loops.
+
+Model, per plague and tick:
+  * Entities are binned into square grid cells of side PLAGUE_SPREAD_RADIUS. An entity's exposure
+    is the number of infectious entities in its own cell and the eight around it, i.e. roughly
+    everyone within PLAGUE_SPREAD_RADIUS.
+  * A susceptible entity exposed to n infectious ones is infected with probability
+    1 - (1 - spread_rate / 100) ** n.
+  * An infection lasts `duration` days of game time (PLAGUE_TICK_SECONDS per tick). After that the
+    entity recovers and is immune to that plague. plague_affected has a unique key on
+    (entity_type, entity_id, plague_id), so an entity can be infected by each plague only once.
+
+Players are positioned by their Stats coordinates and rats by their colony's coordinates. Entities
+without coordinates take no part.
+
+flush() writes new infections with multi-row INSERTs and recoveries with one executemany UPDATE.
+It keeps the relation_id of every persisted row, loaded with the existing rows or read back after the
+INSERTs, so that it can invalidate the cached plague_affected:<relation_id> key of a recovered row.
+
+Usage:
+    python plague_sim.py 24                # advance 24 ticks and write the results
+"""
+import logging
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import and_, bindparam, insert, select, tuple_, update
+
+import cache_tags
+import live_events
+from db_routing import WriteSession
+from models import Colony, Plague, PlagueAffected, PlagueRat, Stats
+
+logger = logging.getLogger(__name__)
+
+PLAGUE_SPREAD_RADIUS = float(os.getenv("PLAGUE_SPREAD_RADIUS", 10))  # coordinate units
+PLAGUE_TICK_SECONDS = int(os.getenv("PLAGUE_TICK_SECONDS", 3600))  # game time per tick
+PLAGUE_WRITE_BATCH_SIZE = int(os.getenv("PLAGUE_WRITE_BATCH_SIZE", 5000))  # rows per INSERT/UPDATE batch
+
+ENTITY_TYPES = ("player", "rat")  # index = value stored in PlagueSimulation.kind
+
+SUSCEPTIBLE, INFECTED, RECOVERED = 0, 1, 2
+
+
+class PlagueSimulation:
+    """
+    Infection state of `kind`/`entity_id` entities at positions `x`/`y` for each plague in
+    `plague_ids`. `status`, `infected_at` and `recovered_at` are (plagues, entities) arrays; times
+    are POSIX timestamps of game time, which starts at `clock`.
+    """
+
+    def __init__(self, kind, entity_id, x, y, plague_ids, spread_rates, durations, clock=None, seed=None):
+        self.kind = np.asarray(kind, dtype=np.int8)
+        self.entity_id = np.asarray(entity_id, dtype=np.int64)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.plague_ids = np.asarray(plague_ids, dtype=np.int64)
+        self.infect_chance = np.clip(np.asarray(spread_rates, dtype=np.float64) / 100, 0, 1)
+        self.duration = np.asarray(durations, dtype=np.float64) * 86400  # days -> seconds
+        self.clock = (clock or datetime.now()).timestamp()
+        self.rng = np.random.default_rng(seed)
+
+        shape = (len(self.plague_ids), len(self.entity_id))
+        self.status = np.zeros(shape, dtype=np.int8)
+        self.infected_at = np.zeros(shape, dtype=np.float64)
+        self.recovered_at = np.zeros(shape, dtype=np.float64)
+        self.persisted = np.zeros(shape, dtype=bool)  # a plague_affected row exists for the pair
+        self.relation_id = np.zeros(shape, dtype=np.int64)  # its relation_id
+        self.recovery_dirty = np.zeros(shape, dtype=bool)  # recovered since the row was written
+
+        # Grid cell of every entity, encoded as one integer. Only occupied cells get a slot; for each
+        # slot the slots of its 3x3 neighbourhood are looked up once here, with len(cells) standing
+        # in for empty neighbours, so a tick only needs a bincount and a gather.
+        cell_x = np.floor((self.x - self.x.min(initial=0)) / PLAGUE_SPREAD_RADIUS).astype(np.int64) + 1
+        cell_y = np.floor((self.y - self.y.min(initial=0)) / PLAGUE_SPREAD_RADIUS).astype(np.int64) + 1
+        columns = int(cell_y.max(initial=0)) + 2
+        cells, self._slot = np.unique(cell_x * columns + cell_y, return_inverse=True)
+        self._neighbours = np.full((9, len(cells)), len(cells), dtype=np.int64)
+        for row, offset in enumerate(dx * columns + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)):
+            if not len(cells):
+                break
+            position = np.minimum(np.searchsorted(cells, cells + offset), len(cells) - 1)
+            self._neighbours[row] = np.where(cells[position] == cells + offset, position, len(cells))
+
+    def __len__(self):
+        return len(self.entity_id)
+
+    def index_of(self, kind, entity_ids):
+        """Positions of the given entity IDs of one kind, -1 for entities not in the simulation."""
+        entity_ids = np.asarray(entity_ids, dtype=np.int64)
+        candidates = np.flatnonzero(self.kind == kind)
+        if not len(candidates):
+            return np.full(len(entity_ids), -1)
+        candidates = candidates[np.argsort(self.entity_id[candidates])]
+        sorted_ids = self.entity_id[candidates]
+        position = np.minimum(np.searchsorted(sorted_ids, entity_ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[position] == entity_ids, candidates[position], -1)
+
+    def seed_infections(self, plague, index, infected_at, recovered_at, relation_ids):
+        """
+        Marks entities at `index` as already infected (or recovered when `recovered_at` is not NaN) by
+        the plague_affected rows `relation_ids`.
+        """
+        recovered = ~np.isnan(recovered_at)
+        self.status[plague, index] = np.where(recovered, RECOVERED, INFECTED)
+        self.infected_at[plague, index] = infected_at
+        self.recovered_at[plague, index] = np.where(recovered, recovered_at, 0)
+        self.persisted[plague, index] = True
+        self.relation_id[plague, index] = relation_ids
+
+    def exposure(self, plague):
+        """Number of infectious entities in the 3x3 cell neighbourhood of every entity."""
+        infectious = np.bincount(self._slot[self.status[plague] == INFECTED], minlength=self._neighbours.shape[1] + 1)
+        return infectious[self._neighbours].sum(axis=0)[self._slot]
+
+    def tick(self):
+        """Advances every plague by one tick and returns (new infections, recoveries)."""
+        self.clock += PLAGUE_TICK_SECONDS
+        infections = recoveries = 0
+        for plague in range(len(self.plague_ids)):
+            status = self.status[plague]
+            # Recoveries first, so entities recovering this tick no longer infect anyone.
+            recovering = (status == INFECTED) & (self.clock - self.infected_at[plague] >= self.duration[plague])
+            status[recovering] = RECOVERED
+            self.recovered_at[plague, recovering] = self.clock
+            self.recovery_dirty[plague] |= recovering & self.persisted[plague]
+            recoveries += int(recovering.sum())
+
+            exposure = self.exposure(plague)
+            susceptible = (status == SUSCEPTIBLE) & (exposure > 0)
+            chance = 1 - (1 - self.infect_chance[plague]) ** exposure[susceptible]
+            infected = np.flatnonzero(susceptible)[self.rng.random(len(chance)) < chance]
+            status[infected] = INFECTED
+            self.infected_at[plague, infected] = self.clock
+            infections += len(infected)
+        return infections, recoveries
+
+    def run(self, ticks):
+        infections = recoveries = 0
+        for _ in range(ticks):
+            new, recovered = self.tick()
+            infections += new
+            recoveries += recovered
+        return infections, recoveries
+
+    def pending(self):
+        """Returns (rows to insert, rows to mark recovered) as lists of column dicts."""
+        inserts, updates = [], []
+        for plague, plague_id in enumerate(self.plague_ids.tolist()):
+            new = np.flatnonzero((self.status[plague] != SUSCEPTIBLE) & ~self.persisted[plague])
+            for index, infected_at, recovered_at in zip(new.tolist(), self.infected_at[plague, new].tolist(),
+                                                        self.recovered_at[plague, new].tolist()):
+                inserts.append({"entity_type": ENTITY_TYPES[self.kind[index]],
+                                "entity_id": int(self.entity_id[index]), "plague_id": plague_id,
+                                "infection_date": datetime.fromtimestamp(infected_at),
+                                "recovery_date": datetime.fromtimestamp(recovered_at) if recovered_at else None})
+            recovered = np.flatnonzero(self.recovery_dirty[plague])
+            for index, recovered_at in zip(recovered.tolist(), self.recovered_at[plague, recovered].tolist()):
+                updates.append({"b_entity_type": ENTITY_TYPES[self.kind[index]],
+                                "b_entity_id": int(self.entity_id[index]), "b_plague_id": plague_id,
+                                "recovery_date": datetime.fromtimestamp(recovered_at),
+                                "relation_id": int(self.relation_id[plague, index])})
+        return inserts, updates
+
+    def flush(self):
+        """Writes new infections and recoveries to plague_affected and returns (inserted, updated)."""
+        inserts, updates = self.pending()
+        table = PlagueAffected.__table__
+        recover = (update(table)
+                   .where(and_(table.c.entity_type == bindparam("b_entity_type"),
+                               table.c.entity_id == bindparam("b_entity_id"),
+                               table.c.plague_id == bindparam("b_plague_id"),
+                               table.c.recovery_date.is_(None)))
+                   .values(recovery_date=bindparam("recovery_date")))
+        session = WriteSession()
+        try:
+            with session.begin():
+                for start in range(0, len(inserts), PLAGUE_WRITE_BATCH_SIZE):
+                    batch = inserts[start:start + PLAGUE_WRITE_BATCH_SIZE]
+                    session.execute(insert(table), batch)
+                    self._read_relation_ids(session, batch)
+                for start in range(0, len(updates), PLAGUE_WRITE_BATCH_SIZE):
+                    session.connection().execute(recover, updates[start:start + PLAGUE_WRITE_BATCH_SIZE])
+        finally:
+            session.close()
+
+        self.persisted |= self.status != SUSCEPTIBLE
+        self.recovery_dirty[:] = False
+        live_events.publish_rows(PlagueAffected, inserts)
+        cache_tags.invalidate_rows(PlagueAffected, [*inserts, *({"relation_id": row["relation_id"],
+                                                                  "entity_type": row["b_entity_type"],
+                                                                  "entity_id": row["b_entity_id"]}
+                                                                 for row in updates)])
+        logger.info(f"Wrote {len(inserts)} new infections and {len(updates)} recoveries")
+        return len(inserts), len(updates)
+
+    def _read_relation_ids(self, session, rows):
+        """Reads back the relation_ids of inserted `rows`, stores them and adds them to the rows."""
+        keys = [(row["entity_type"], row["entity_id"], row["plague_id"]) for row in rows]
+        table = PlagueAffected.__table__
+        found = {(entity_type, entity_id, plague_id): relation_id
+                 for relation_id, entity_type, entity_id, plague_id in session.execute(
+                     select(table.c.relation_id, table.c.entity_type, table.c.entity_id, table.c.plague_id)
+                     .where(tuple_(table.c.entity_type, table.c.entity_id, table.c.plague_id).in_(keys)))}
+        plague_index = {plague_id: plague for plague, plague_id in enumerate(self.plague_ids.tolist())}
+        for kind_value, name in enumerate(ENTITY_TYPES):
+            of_kind = [(row, key) for row, key in zip(rows, keys) if key[0] == name]
+            if not of_kind:
+                continue
+            index = self.index_of(kind_value, [key[1] for _, key in of_kind])
+            for (row, key), position in zip(of_kind, index.tolist()):
+                row["relation_id"] = found[key]
+                self.relation_id[plague_index[key[2]], position] = found[key]
+
+
+def load(session, clock=None, seed=None):
+    """Builds a PlagueSimulation from the database: positioned players and rats, plagues and infections."""
+    players = session.execute(
+        select(Stats.player_id, Stats.x_coordinate, Stats.y_coordinate)
+        .where(Stats.x_coordinate.is_not(None), Stats.y_coordinate.is_not(None))).all()
+    rats = session.execute(
+        select(PlagueRat.rat_id, Colony.x_coordinate, Colony.y_coordinate)
+        .join(Colony, PlagueRat.colony_id == Colony.colony_id)
+        .where(Colony.x_coordinate.is_not(None), Colony.y_coordinate.is_not(None))).all()
+    plagues = session.execute(select(Plague.plague_id, Plague.spread_rate, Plague.duration)
+                              .order_by(Plague.plague_id)).all()
+
+    kind = np.concatenate([np.zeros(len(players), np.int8), np.ones(len(rats), np.int8)])
+    rows = [*players, *rats]
+    sim = PlagueSimulation(kind, [row[0] for row in rows], [float(row[1]) for row in rows],
+                           [float(row[2]) for row in rows], [plague.plague_id for plague in plagues],
+                           [plague.spread_rate or 0 for plague in plagues],
+                           [plague.duration or 1 for plague in plagues], clock=clock, seed=seed)
+
+    affected = session.execute(select(PlagueAffected.entity_type, PlagueAffected.entity_id, PlagueAffected.plague_id,
+                                      PlagueAffected.infection_date, PlagueAffected.recovery_date,
+                                      PlagueAffected.relation_id)).all()
+    if affected:
+        entity_type = np.array([row.entity_type for row in affected])
+        entity_id = np.array([row.entity_id for row in affected], dtype=np.int64)
+        plague_id = np.array([row.plague_id for row in affected], dtype=np.int64)
+        infected_at = np.array([row.infection_date.timestamp() for row in affected])
+        recovered_at = np.array([row.recovery_date.timestamp() if row.recovery_date else np.nan for row in affected])
+        relation_id = np.array([row.relation_id for row in affected], dtype=np.int64)
+        for plague, current in enumerate(sim.plague_ids):
+            for kind_value, name in enumerate(ENTITY_TYPES):
+                rows = np.flatnonzero((plague_id == current) & (entity_type == name))
+                index = sim.index_of(kind_value, entity_id[rows])
+                known = index >= 0
+                sim.seed_infections(plague, index[known], infected_at[rows][known], recovered_at[rows][known],
+                                    relation_id[rows][known])
+    return sim
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    session = WriteSession()
+    try:
+        simulation = load(session)
+    finally:
+        session.close()
+    print(f"entities: {len(simulation)}, plagues: {len(simulation.plague_ids)}")
+    infections, recoveries = simulation.run(ticks)
+    print(f"{ticks} ticks: {infections} infections, {recoveries} recoveries")
+    simulation.flush()
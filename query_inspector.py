@@ -0,0 +1,172 @@
+"""
+Development/staging helper that watches the SQL issued by each request. It counts statements,
+flags statements repeated with different parameters (the N+1 pattern of lazy relationships such as
+Colony.rats or Battle.participants), logs slow statements with their EXPLAIN plan and enforces a
+per-request query budget.
+
+Enable it with QUERY_INSPECTOR=true. With QUERY_BUDGET_STRICT=true a request over its budget raises
+QueryBudgetExceeded, which fails the request (and any test calling it through the test client).
+"""
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+QUERY_INSPECTOR = os.getenv("QUERY_INSPECTOR", "false").lower() == "true"
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 10))  # statements per request unless a route overrides it
+QUERY_BUDGET_STRICT = os.getenv("QUERY_BUDGET_STRICT", "false").lower() == "true"
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", 3))  # identical statements before flagging N+1
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """
+    Overrides QUERY_BUDGET for one route: @query_budget(2) above the view function. `limit` may also be a
+    function of the view's arguments, for routes whose statement count depends on the request.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.query_budget = limit(*args, **kwargs) if callable(limit) else limit
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class QueryLog:
+    """Statements captured during a request or a capture_queries() block."""
+
+    def __init__(self):
+        self.statements = []  # (statement, seconds)
+
+    def __len__(self):
+        return len(self.statements)
+
+    @property
+    def total_time(self):
+        return sum(seconds for _, seconds in self.statements)
+
+    def repeated(self, threshold=QUERY_REPEAT_THRESHOLD):
+        """Returns {statement: count} for statements executed at least `threshold` times."""
+        counts = Counter(statement for statement, _ in self.statements)
+        return {statement: count for statement, count in counts.items() if count >= threshold}
+
+
+_captures = threading.local()
+
+
+@contextmanager
+def capture_queries():
+    """
+    Collects every statement executed by this thread inside the block, e.g. in a test:
+
+        with capture_queries() as queries:
+            client.get("/colonies/1")
+        assert len(queries) <= 2, queries.repeated()
+    """
+    _install_listeners()
+    stack = _captures.__dict__.setdefault("stack", [])
+    log = QueryLog()
+    stack.append(log)
+    try:
+        yield log
+    finally:
+        stack.remove(log)
+
+
+def _active_logs():
+    logs = list(getattr(_captures, "stack", []))
+    if has_request_context() and "query_log" in g:
+        logs.append(g.query_log)
+    return logs
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("inspector_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["inspector_start_time"].pop()
+    if conn.info.get("explaining"):
+        return
+    for log in _active_logs():
+        log.statements.append((statement, elapsed))
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(f"Slow query ({elapsed * 1000:.1f} ms): {statement} {parameters!r}\n"
+                       f"{explain(conn.engine, statement, parameters, executemany)}")
+
+
+def _handle_error(context):
+    """Drops the start time of a statement that raised, for which after_cursor_execute never runs."""
+    conn = context.connection
+    if conn is not None and context.execution_context is not None and conn.info.get("inspector_start_time"):
+        conn.info["inspector_start_time"].pop()
+
+
+def explain(engine, statement, parameters, executemany=False):
+    """Returns the database's plan for a SELECT as text, run on a separate pooled connection."""
+    if executemany or not statement.lstrip().upper().startswith("SELECT"):
+        return "(no plan: not a single SELECT)"
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        with engine.connect() as explain_conn:
+            explain_conn.info["explaining"] = True
+            try:
+                rows = explain_conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+            finally:
+                explain_conn.info.pop("explaining", None)
+    except Exception as e:
+        return f"(EXPLAIN failed: {e})"
+    return "\n".join(" | ".join(str(value) for value in row) for row in rows)
+
+
+def _start_request():
+    g.query_log = QueryLog()
+
+
+def _finish_request(response):
+    log = g.pop("query_log", None)
+    if log is None:
+        return response
+    route = request.url_rule.rule if request.url_rule is not None else request.path
+    budget = g.get("query_budget", QUERY_BUDGET)
+    response.headers["X-Query-Count"] = str(len(log))
+
+    for statement, count in log.repeated().items():
+        logger.warning(f"Possible N+1 on {route}: statement executed {count} times: {statement}")
+    if len(log) > budget:
+        message = f"{route} issued {len(log)} queries, over its budget of {budget}"
+        if QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+def _install_listeners():
+    if not event.contains(Engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def init_app(app):
+    """Installs the per-request query inspector when QUERY_INSPECTOR is enabled."""
+    if not QUERY_INSPECTOR:
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    _install_listeners()
+    logger.info(f"Query inspector enabled (budget {QUERY_BUDGET}, slow query threshold {SLOW_QUERY_MS} ms)")
@@ -0,0 +1,81 @@
+"""
+The reference data bundle behind GET /reference/bundle: every slowly changing lookup table clients
+load at startup, in one versioned, gzip-compressed document.
+
+    {"version": "3f1c...", "severities": [...], "effect_types": [...], ..., "achievements": [...]}
+
+The version is a hash of the content, so it only changes when the data does and is the same in every
+process. It doubles as the ETag: a client that sends it back in If-None-Match gets a 304. The bundle
+is built once and cached compressed under BUNDLE_KEY, tagged with every table it contains. Any
+invalidation of one of those tables (cache_tags) drops it, and the next request rebuilds it.
+"""
+import gzip
+import hashlib
+import json
+import logging
+
+import cache_tags
+from db_routing import ReadSession
+from db_utils import redis_client
+from models import Achievement, DayNightTime, EffectType, Equipment, Item, Severity, Weather, WeatherEffects
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_KEY = "reference_bundle"
+
+# Bundle section -> model, in the order clients usually need them.
+SECTIONS = {
+    "severities": Severity,
+    "effect_types": EffectType,
+    "weather_effects": WeatherEffects,
+    "weather": Weather,
+    "day_night_times": DayNightTime,
+    "items": Item,
+    "equipment": Equipment,
+    "achievements": Achievement,
+}
+
+
+class Bundle:
+    """A built bundle: its version (the ETag) and the gzip-compressed JSON document."""
+
+    def __init__(self, version, compressed):
+        self.version = version
+        self.compressed = compressed
+
+    def to_bytes(self):
+        return self.version.encode('utf-8') + b"\n" + self.compressed
+
+    @classmethod
+    def from_bytes(cls, value):
+        version, _, compressed = value.partition(b"\n")
+        return cls(version.decode('utf-8'), compressed)
+
+    def body(self):
+        return gzip.decompress(self.compressed)
+
+
+def build(session):
+    """Reads every section from the database and returns the Bundle."""
+    sections = {name: [row.serialize() for row in session.query(model).all()] for name, model in SECTIONS.items()}
+    content = json.dumps(sections, sort_keys=True, separators=(",", ":"))
+    version = hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+    document = json.dumps({"version": version, **sections}, separators=(",", ":")).encode('utf-8')
+    # mtime=0 keeps the compressed bytes identical for identical content.
+    return Bundle(version, gzip.compress(document, mtime=0))
+
+
+def get():
+    """The current bundle, from Redis or freshly built (and cached) when it is missing."""
+    cached = redis_client.get(BUNDLE_KEY)
+    if cached:
+        return Bundle.from_bytes(cached)
+    session = ReadSession()
+    try:
+        bundle = build(session)
+    finally:
+        session.close()
+    cache_tags.store(BUNDLE_KEY, bundle.to_bytes(), tags=[model.__tablename__ for model in SECTIONS.values()],
+                     stale=False)  # binary, not a JSON payload stale_cache.py could serve
+    logger.info(f"Built reference bundle {bundle.version} ({len(bundle.compressed)} bytes compressed)")
+    return bundle
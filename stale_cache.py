@@ -0,0 +1,133 @@
+"""
+Stale-while-error serving for the cached read routes.
+
+Every value cache_tags.store() writes also leaves a stale copy (stale:<key>) that lives
+CACHE_GRACE_TTL seconds longer than the value and survives invalidation. When a route fails on its
+database path (a 500, or a 503 from admission.py) after reading its cache key with compression.get(),
+fallback() replaces the error with that copy, marked with
+
+    Warning: 110 - "Response is Stale"
+    Age: <seconds since the copy was stored>
+
+and queues the key for a background refresh, which retries every STALE_REFRESH_INTERVAL seconds until
+MySQL answers again. With STALE_DB_DEADLINE_MS set, SELECTs of the read routes carry MySQL's
+MAX_EXECUTION_TIME hint, so a slow database fails fast and the stale copy is served instead of
+waiting. Stale copies are never served while MySQL works: a route that succeeds refreshes its value.
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+
+from flask import g
+from sqlalchemy import event
+
+import admission
+import cache_keys
+import cache_warmup
+import compression
+from db_utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+STALE_DB_DEADLINE_MS = int(os.getenv("STALE_DB_DEADLINE_MS", 0))  # per-SELECT limit on MySQL, 0 disables
+STALE_REFRESH_INTERVAL = float(os.getenv("STALE_REFRESH_INTERVAL", 5))  # seconds between refresh attempts
+STALE_REFRESH_MAX_KEYS = int(os.getenv("STALE_REFRESH_MAX_KEYS", 1000))  # keys queued per process
+
+STALE_STATUSES = (500, 503)
+
+
+def get(key):
+    """Returns (value, age in seconds) of the stale copy of `key`, or None."""
+    copy = redis_client.hgetall(cache_keys.stale_key(key))
+    if not copy or b"value" not in copy:
+        return None
+    return copy[b"value"], max(0, int(time.time()) - int(copy.get(b"stored_at", 0)))
+
+
+def fallback(response):
+    """
+    after_request hook: replaces a failed response with the stale copy of the request's cache key,
+    if there is one.
+    """
+    key = g.get("cache_key")
+    if response.status_code not in STALE_STATUSES or key is None:
+        return response
+    stale = get(key)
+    if stale is None:
+        return response
+    value, age = stale
+    logger.warning(f"Serving {key} stale ({age}s old) after a {response.status_code}")
+    refresher.add(key)
+    stale_response = compression.respond(value)
+    stale_response.headers["Warning"] = '110 - "Response is Stale"'
+    stale_response.headers["Age"] = str(age)
+    return stale_response
+
+
+class StaleRefresher:
+    """Reloads keys served stale from MySQL in a daemon thread, keeping them until a reload succeeds."""
+
+    def __init__(self, interval, max_keys):
+        self.interval = interval
+        self.max_keys = max_keys
+        self.pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, key):
+        with self._lock:
+            if len(self.pending) < self.max_keys:
+                self.pending.add(key)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self.run, name="stale-refresher", daemon=True)
+                self._thread.start()
+
+    def refresh(self):
+        """Reloads the pending keys once; returns how many were reloaded, keeping them all on failure."""
+        with self._lock:
+            keys, self.pending = list(self.pending), set()
+        if not keys:
+            return 0
+        try:
+            # Keys cache_keys.load() cannot rebuild (e.g. collections) are dropped here and refilled
+            # by their routes' next request.
+            reloaded = cache_warmup.reload_keys(keys)
+        except Exception as e:
+            with self._lock:
+                self.pending.update(keys[:self.max_keys - len(self.pending)])
+            logger.warning(f"Could not refresh {len(keys)} stale keys yet: {e}")
+            return 0
+        logger.info(f"Refreshed {reloaded} keys that were served stale")
+        return reloaded
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            self.refresh()
+            with self._lock:
+                if not self.pending:
+                    self._thread = None
+                    return
+
+
+refresher = StaleRefresher(STALE_REFRESH_INTERVAL, STALE_REFRESH_MAX_KEYS)
+
+_hinted = weakref.WeakKeyDictionary()  # statement -> the same statement with the deadline hint
+
+
+def _add_deadline(orm_execute_state):
+    if not orm_execute_state.is_select:
+        return
+    statement = orm_execute_state.statement
+    hinted = _hinted.get(statement)
+    if hinted is None:
+        # Rendered on MySQL only; prebuilt statements (lookups.py) keep one hinted copy each.
+        hinted = _hinted[statement] = statement.prefix_with(
+            f"/*+ MAX_EXECUTION_TIME({STALE_DB_DEADLINE_MS}) */", dialect="mysql")
+    orm_execute_state.statement = hinted
+
+
+if STALE_DB_DEADLINE_MS > 0:
+    event.listen(admission.AdmittedSession, "do_orm_execute", _add_deadline)
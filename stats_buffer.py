@@ -0,0 +1,360 @@
+"""
+Write-behind buffer for player Stats.
+
+Stat updates land in a Redis hash per player (stats_live:<player_id>) and the player is added to
+the `stats_dirty` set. /stats/<player_id> reads the live hash first, so clients see every update
+immediately, while a flusher writes dirty players to the `stats` table every STATS_FLUSH_INTERVAL
+seconds using multi-row upserts.
+
+Flushes are crash-safe: the flusher renames `stats_dirty` to `stats_flushing` before writing, and
+removes players from `stats_flushing` only after their rows are committed. If a flush dies halfway,
+the players it did not finish stay in `stats_flushing`, and the next flush (in any process) picks
+them up before taking new dirty players. Upserts write the full current state, so flushing a
+player twice is harmless. A short-lived lock makes sure only one process flushes at a time.
+
+Updates run as one Lua script that applies them only to a hash that exists or is seeded in the same
+call, so a hash expiring between two updates never comes back with only the updated fields.
+
+When Redis is unavailable, updates are written straight to MySQL instead.
+
+Usage:
+    python stats_buffer.py                 # flush every dirty player once, e.g. before a deploy
+"""
+import atexit
+import logging
+import os
+import threading
+import uuid
+from decimal import Decimal, InvalidOperation
+
+import redis
+from sqlalchemy import update as sql_update
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+
+import cache_tags
+from db_routing import WriteSession
+from db_utils import redis_client
+from models import Player, Stats
+
+logger = logging.getLogger(__name__)
+
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", 5))  # seconds, 0 disables the flusher
+STATS_FLUSH_BATCH_SIZE = int(os.getenv("STATS_FLUSH_BATCH_SIZE", 500))  # players per upsert statement
+STATS_LIVE_TTL = int(os.getenv("STATS_LIVE_TTL", 3600))  # seconds an idle player's live stats stay in Redis
+STATS_FLUSH_LOCK_TTL = int(os.getenv("STATS_FLUSH_LOCK_TTL", 60))  # seconds before a dead flusher's lock expires
+
+DIRTY_KEY = "stats_dirty"
+FLUSHING_KEY = "stats_flushing"
+LOCK_KEY = "stats_flush_lock"
+
+# KEYS: live hash, dirty set; ARGV: TTL, player ID, number of seed fields, seed fields and values,
+# number of fields to set, fields and values, then fields and deltas to increment.
+# Returns 0 without changes when the hash does not exist and there is no seed, else the new hash.
+_UPDATE = """
+local seeds = tonumber(ARGV[3])
+local i = 4
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    if seeds == 0 then
+        return 0
+    end
+    for j = i, i + 2 * seeds - 1, 2 do
+        redis.call('HSET', KEYS[1], ARGV[j], ARGV[j + 1])
+    end
+end
+i = i + 2 * seeds
+local sets = tonumber(ARGV[i])
+i = i + 1
+for j = i, i + 2 * sets - 1, 2 do
+    redis.call('HSET', KEYS[1], ARGV[j], ARGV[j + 1])
+end
+i = i + 2 * sets
+while i < #ARGV do
+    redis.call('HINCRBY', KEYS[1], ARGV[i], ARGV[i + 1])
+    i = i + 2
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[2])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# KEYS: lock; ARGV: token. Deletes the lock only while this flusher still holds it.
+_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS: lock; ARGV: token, TTL. Extends the lock only while this flusher still holds it.
+_EXTEND = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+INTEGER_FIELDS = ("HP", "MP", "AP", "XP", "SP")
+DECIMAL_FIELDS = ("x_coordinate", "y_coordinate")
+
+
+def live_key(player_id):
+    return f"stats_live:{player_id}"
+
+
+def _decode(mapping):
+    """Turns a live-stats hash into the same dict Stats.serialize() returns, or None if it is empty or incomplete."""
+    mapping = {key.decode('utf-8'): value.decode('utf-8') for key, value in mapping.items()}
+    if 'player_id' not in mapping:
+        if mapping:
+            logger.warning(f"Ignoring incomplete live stats {mapping}")
+        return None
+    stats = {'player_id': int(mapping['player_id'])}
+    for field in INTEGER_FIELDS:
+        stats[field] = int(mapping[field]) if mapping.get(field, "") != "" else None
+    for field in DECIMAL_FIELDS:
+        stats[field] = mapping.get(field) or None
+    return stats
+
+
+def _encode(stats):
+    return {field: "" if value is None else str(value) for field, value in stats.items()}
+
+
+def _row(stats):
+    """Converts a decoded live-stats dict into column values for the `stats` table."""
+    row = dict(stats)
+    for field in DECIMAL_FIELDS:
+        row[field] = Decimal(row[field]) if row[field] is not None else None
+    return row
+
+
+def validate(values=None, increments=None):
+    """
+    Checks an update: `values` maps stat names to new values, `increments` maps integer stat names
+    to deltas. Returns (values, increments) normalized for Redis; raises ValueError otherwise.
+    """
+    values = dict(values or {})
+    increments = dict(increments or {})
+    if not values and not increments:
+        raise ValueError("no stats to update")
+    for field, value in values.items():
+        if field in INTEGER_FIELDS:
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f"'{field}' must be an integer")
+        elif field in DECIMAL_FIELDS:
+            if value is not None:
+                try:
+                    values[field] = str(Decimal(str(value)).quantize(Decimal("0.000001")))
+                except InvalidOperation:
+                    raise ValueError(f"'{field}' must be a decimal number")
+        else:
+            raise ValueError(f"unknown stat '{field}'")
+    for field, delta in increments.items():
+        if field not in INTEGER_FIELDS:
+            raise ValueError(f"only {', '.join(INTEGER_FIELDS)} can be incremented")
+        if isinstance(delta, bool) or not isinstance(delta, int):
+            raise ValueError(f"increment for '{field}' must be an integer")
+        if field in values:
+            raise ValueError(f"'{field}' cannot be set and incremented at once")
+    return values, increments
+
+
+def _load(player_id):
+    """Current stats from MySQL, column defaults for a player without a stats row, or None for no player."""
+    session = WriteSession()  # the primary: a lagging replica could miss the last flush
+    try:
+        stat = session.get(Stats, player_id)
+        if stat is not None:
+            return stat.serialize()
+        if session.get(Player, player_id) is None:
+            return None
+        defaults = {column.name: column.default.arg if column.default is not None else None
+                    for column in Stats.__table__.columns}
+        return {**defaults, 'player_id': player_id}
+    finally:
+        session.close()
+
+
+def get(player_id):
+    """Live stats for a player, or None if nothing is buffered for them (or Redis is unavailable)."""
+    mapping = redis_client.hgetall(live_key(player_id))
+    return _decode(mapping) if mapping else None
+
+
+def get_many(player_ids):
+    """get() for several players in one round trip: {player_id: live stats} for those with buffered stats."""
+    player_ids = list(player_ids)
+    if not player_ids:
+        return {}
+    pipe = redis_client.pipeline()
+    for player_id in player_ids:
+        pipe.hgetall(live_key(player_id))
+    mappings = redis_client.execute(pipe) or []
+    live = {player_id: _decode(mapping) for player_id, mapping in zip(player_ids, mappings) if mapping}
+    return {player_id: stats for player_id, stats in live.items() if stats is not None}
+
+
+def update(player_id, values=None, increments=None):
+    """
+    Applies a stat update for `player_id` and returns the player's new stats, or None if the player
+    does not exist. Raises ValueError for invalid updates.
+    """
+    values, increments = validate(values, increments)
+    changes = [len(values), *_pairs(_encode(values)), *_pairs(increments)]
+
+    # The first attempt assumes the player's hash exists; only if it does not are their stats loaded
+    # from MySQL and passed along as the seed.
+    seed = {}
+    while True:
+        result = redis_client.eval(_UPDATE, 2, live_key(player_id), DIRTY_KEY, STATS_LIVE_TTL, player_id,
+                                   len(seed), *_pairs(seed), *changes)
+        if result is None:
+            return _write_through(player_id, values, increments)
+        if result != 0:
+            return _decode(dict(zip(result[::2], result[1::2])))
+        current = _load(player_id)
+        if current is None:
+            return None
+        seed = _encode(current)
+
+
+def _pairs(mapping):
+    return [item for pair in mapping.items() for item in pair]
+
+
+def _write_through(player_id, values, increments):
+    """Fallback for updates while Redis is unavailable: writes the update to MySQL directly."""
+    logger.warning(f"Redis unavailable, writing stats for player {player_id} straight to MySQL")
+    current = _load(player_id)
+    if current is None:
+        return None
+    assignments = {field: Decimal(value) if field in DECIMAL_FIELDS and value is not None else value
+                   for field, value in values.items()}
+    for field, delta in increments.items():
+        assignments[field] = getattr(Stats, field) + delta
+    session = WriteSession()
+    try:
+        with session.begin():
+            if session.get(Stats, player_id) is None:
+                session.add(Stats(**_row(current)))
+                session.flush()
+            session.execute(sql_update(Stats).where(Stats.player_id == player_id).values(**assignments))
+        cache_tags.invalidate_rows(Stats, [{'player_id': player_id}])
+        return session.get(Stats, player_id).serialize()
+    finally:
+        session.close()
+
+
+def _upsert(session, rows):
+    """Writes `rows` to the stats table: one multi-row upsert on MySQL and SQLite, a merge per row elsewhere."""
+    dialect = session.get_bind().dialect.name
+    if dialect == "mysql":
+        statement = mysql.insert(Stats).values(rows)
+        session.execute(statement.on_duplicate_key_update({field: statement.inserted[field]
+                                                           for field in (*INTEGER_FIELDS, *DECIMAL_FIELDS)}))
+    elif dialect == "sqlite":
+        statement = sqlite.insert(Stats).values(rows)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[Stats.player_id],
+            set_={field: statement.excluded[field] for field in (*INTEGER_FIELDS, *DECIMAL_FIELDS)}))
+    else:
+        for row in rows:
+            session.merge(Stats(**row))
+
+
+def _acquire_lock():
+    token = uuid.uuid4().hex
+    return token if redis_client.set(LOCK_KEY, token, ex=STATS_FLUSH_LOCK_TTL, nx=True) else None
+
+
+def _extend_lock(token):
+    redis_client.eval(_EXTEND, 1, LOCK_KEY, token, STATS_FLUSH_LOCK_TTL)
+
+
+def _release_lock(token):
+    # Atomic, so a lock that expired and was taken by another flusher is never deleted.
+    redis_client.eval(_RELEASE, 1, LOCK_KEY, token)
+
+
+def flush():
+    """Writes every dirty player's live stats to MySQL and returns how many players were flushed."""
+    token = _acquire_lock()
+    if token is None:
+        return 0  # another process is flushing, or Redis is unavailable
+    flushed = 0
+    try:
+        if not redis_client.exists(FLUSHING_KEY):
+            try:
+                redis_client.rename(DIRTY_KEY, FLUSHING_KEY)
+            except redis.exceptions.ResponseError:
+                return 0  # nothing is dirty
+        else:
+            logger.warning("Resuming an interrupted stats flush")
+
+        while True:
+            player_ids = redis_client.srandmember(FLUSHING_KEY, STATS_FLUSH_BATCH_SIZE)
+            if not player_ids:
+                break
+            pipe = redis_client.pipeline()
+            for player_id in player_ids:
+                pipe.hgetall(live_key(player_id.decode('utf-8')))
+            mappings = redis_client.execute(pipe)
+            if mappings is None:
+                break  # Redis went away; the remaining players stay in stats_flushing
+            rows = [_row(stats) for stats in map(_decode, mappings) if stats is not None]
+
+            if rows:
+                session = WriteSession()
+                try:
+                    with session.begin():
+                        _upsert(session, rows)
+                finally:
+                    session.close()
+            # Only now that the rows are committed do the players leave the flushing set.
+            redis_client.srem(FLUSHING_KEY, *player_ids)
+            cache_tags.invalidate_rows(Stats, rows)
+            _extend_lock(token)
+            flushed += len(rows)
+    except SQLAlchemyError as e:
+        logger.error(f"Error flushing stats after {flushed} players, will retry: {e}")
+    finally:
+        _release_lock(token)
+    if flushed:
+        logger.info(f"Flushed stats for {flushed} players")
+    return flushed
+
+
+class StatsFlusher(threading.Thread):
+    """Daemon thread calling flush() every `interval` seconds, plus once more when stopped."""
+
+    def __init__(self, interval):
+        super().__init__(name="stats-flusher", daemon=True)
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                flush()
+            except Exception as e:
+                logger.error(f"Error flushing stats: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        flush()
+
+
+def start_flusher():
+    """Starts the flusher if STATS_FLUSH_INTERVAL is set; it flushes a last time at interpreter exit."""
+    if STATS_FLUSH_INTERVAL <= 0:
+        return None
+    flusher = StatsFlusher(STATS_FLUSH_INTERVAL)
+    flusher.start()
+    atexit.register(flusher.stop)
+    return flusher
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"flushed: {flush()}")
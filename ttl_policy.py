@@ -0,0 +1,180 @@
+"""
+Adaptive TTLs for the Redis cache, chosen per key family from observed invalidations and lookups.
+
+Every cached value is invalidated on write through cache_tags, so a TTL only bounds how long a value
+can outlive a change made outside the application (e.g. by hand in MySQL) and how long unused keys
+occupy memory. The policy, in order:
+    override      CACHE_TTL_OVERRIDES pins a family, e.g. "all_severities=604800,all_game_events=60"
+    warming up    CACHE_TTL until CACHE_TTL_HALF_LIFE seconds of invalidations have been observed
+    stable        the family's table was invalidated less than once per half-life (reference data such
+                  as severities or effect types): CACHE_TTL_MAX
+    on write      detail families keep CACHE_TTL; a write only evicts the row it changed
+    volatile      list and collection families, which every write to the table evicts, live about as long
+                  as the table goes without a write: 1 / invalidation rate, clamped to [CACHE_TTL_MIN, CACHE_TTL]
+
+Invalidation rates are exponentially decaying counters in the `cache_invalidations` Redis hash, updated
+by cache_tags in every process and re-read every CACHE_TTL_SYNC seconds. Hit and miss counts are kept
+per process and only reported by GET /admin/cache/ttl.
+
+Usage:
+    python ttl_policy.py                   # print the current policy
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+
+import cache_keys
+from cache_keys import CACHE_TTL, COLLECTIONS, DETAIL_PREFIXES, LIST_KEYS
+from db_utils import redis_client
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_MIN = int(os.getenv("CACHE_TTL_MIN", 60))  # seconds, shortest TTL given to a volatile family
+CACHE_TTL_MAX = int(os.getenv("CACHE_TTL_MAX", 86400))  # seconds, TTL of families that are never written
+CACHE_TTL_HALF_LIFE = float(os.getenv("CACHE_TTL_HALF_LIFE", 3600))  # seconds for an invalidation to weigh half
+CACHE_TTL_SYNC = float(os.getenv("CACHE_TTL_SYNC", 30))  # seconds between reads of the shared rates
+CACHE_TTL_OVERRIDES = os.getenv("CACHE_TTL_OVERRIDES", "")  # comma separated family=seconds pairs
+
+INVALIDATIONS_KEY = "cache_invalidations"
+SINCE_FIELD = "_since"
+
+# Family -> (table, kind); kind says which writes to the table evict the family's keys.
+FAMILIES = {
+    **{family: (model.__tablename__, "list") for family, model in LIST_KEYS.items()},
+    **{family: (model.__tablename__, "detail") for family, model in DETAIL_PREFIXES.items()},
+    **{family: (model.__tablename__, "collection") for family, (model, _, _) in COLLECTIONS.items()},
+}
+
+# Decays the table's counter (field "<table>", stamp in "<table>:at") to ARGV[1] = now and adds one.
+_RECORD = """
+local now, half_life = tonumber(ARGV[1]), tonumber(ARGV[2])
+redis.call('HSETNX', KEYS[1], '_since', ARGV[1])
+for i = 3, #ARGV do
+    local value = tonumber(redis.call('HGET', KEYS[1], ARGV[i]) or '0')
+    local at = tonumber(redis.call('HGET', KEYS[1], ARGV[i] .. ':at') or ARGV[1])
+    value = value * math.pow(0.5, math.max(now - at, 0) / half_life) + 1
+    redis.call('HSET', KEYS[1], ARGV[i], tostring(value), ARGV[i] .. ':at', ARGV[1])
+end
+return #ARGV - 2
+"""
+
+
+def parse_overrides(spec):
+    """Parses "family=seconds,family=seconds" into a dict, skipping malformed pairs."""
+    overrides = {}
+    for item in spec.split(","):
+        family, _, ttl = item.partition("=")
+        if not item.strip():
+            continue
+        if not ttl.strip().isdigit():
+            logger.warning(f"Ignoring malformed CACHE_TTL_OVERRIDES entry '{item}'")
+            continue
+        overrides[family.strip()] = int(ttl)
+    return overrides
+
+
+class TTLPolicy:
+    def __init__(self, overrides=None, default=CACHE_TTL, minimum=CACHE_TTL_MIN, maximum=CACHE_TTL_MAX,
+                 half_life=CACHE_TTL_HALF_LIFE):
+        self.overrides = dict(overrides or {})
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.half_life = half_life
+        self.lookups = defaultdict(lambda: {"hit": 0, "miss": 0, "error": 0})
+        self._rates = None  # table -> invalidations per second, None until the first sync
+        self._since = None  # wall-clock time of the first invalidation recorded in Redis
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def record_lookup(self, key, value, ok):
+        """redis_client listener counting hits, misses and errors per family."""
+        if isinstance(key, bytes):
+            key = key.decode('utf-8')
+        outcome = "error" if not ok else "miss" if value is None else "hit"
+        with self._lock:
+            self.lookups[cache_keys.family_of(key)][outcome] += 1
+
+    def record_invalidation(self, tables):
+        """Adds one invalidation of each of `tables` to the shared counters; called by cache_tags."""
+        tables = sorted(set(tables))
+        if tables:
+            redis_client.eval(_RECORD, 1, INVALIDATIONS_KEY, time.time(), self.half_life, *tables)
+
+    def rates(self):
+        """Invalidations per second by table, re-read from Redis at most every CACHE_TTL_SYNC seconds."""
+        with self._lock:
+            if self._rates is not None and time.monotonic() - self._synced_at < CACHE_TTL_SYNC:
+                return self._rates
+            self._synced_at = time.monotonic()
+        counters = redis_client.hgetall(INVALIDATIONS_KEY)
+        if counters is None:
+            return self._rates or {}  # Redis is down, keep the last known rates
+        counters = {field.decode('utf-8'): float(value) for field, value in counters.items()}
+        now = time.time()
+        rates = {}
+        for field, value in counters.items():
+            if field != SINCE_FIELD and not field.endswith(":at"):
+                age = max(now - counters.get(f"{field}:at", now), 0)
+                rates[field] = value * 0.5 ** (age / self.half_life) * math.log(2) / self.half_life
+        with self._lock:
+            self._rates = rates
+            self._since = counters.get(SINCE_FIELD)
+        return rates
+
+    def decide(self, family):
+        """Returns (ttl, reason) for a key family."""
+        if family in self.overrides:
+            return self.overrides[family], "override"
+        if family not in FAMILIES:
+            return self.default, "unknown family"
+        table, kind = FAMILIES[family]
+        rate = self.rates().get(table, 0.0)
+        if rate * self.half_life < 1:
+            if self._since is None or time.time() - self._since < self.half_life:
+                return self.default, "warming up"
+            return self.maximum, "stable"
+        if kind == "detail":
+            return self.default, "on write"
+        return int(min(max(1 / rate, self.minimum), self.default)), "volatile"
+
+    def ttl_for(self, key):
+        return self.decide(cache_keys.family_of(key))[0]
+
+    def report(self):
+        """The policy of every known family, with its table's invalidation rate and this process's hit ratio."""
+        rates = self.rates()
+        with self._lock:
+            lookups = {family: dict(counts) for family, counts in self.lookups.items()}
+        report = {}
+        for family in sorted(set(FAMILIES) | set(self.overrides)):
+            ttl, reason = self.decide(family)
+            counts = lookups.get(family, {"hit": 0, "miss": 0, "error": 0})
+            reads = counts["hit"] + counts["miss"]
+            table = FAMILIES.get(family, (None, None))[0]
+            report[family] = {
+                "ttl": ttl,
+                "reason": reason,
+                "invalidations_per_hour": round(rates.get(table, 0.0) * 3600, 2),
+                "hit_ratio": round(counts["hit"] / reads, 3) if reads else None,
+                **counts,
+            }
+        return report
+
+
+policy = TTLPolicy(parse_overrides(CACHE_TTL_OVERRIDES))
+redis_client.listeners.append(policy.record_lookup)
+
+
+def ttl_for(key):
+    """The TTL for a cache key under the shared policy."""
+    return policy.ttl_for(key)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(policy.report(), indent=2))
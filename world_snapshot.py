@@ -0,0 +1,274 @@
+"""
+Memory-mapped snapshot of the world state game servers need at boot: players, colonies, plague rats,
+colony rats, stats and the reference tables of reference_bundle.py, in one fixed-layout binary file.
+Player e-mail addresses and password hashes are left out (EXCLUDED_COLUMNS).
+
+Layout (little-endian, every section 64-byte aligned):
+    header      64 bytes: magic b"PRWS", format version (u32), built at (u64, ms since the epoch),
+                directory offset (u64), directory length (u64), zero padding
+    columns     one contiguous array per column:
+                  int32 / int64      INT and BIGINT values
+                  decimal            int64 holding value * 10**scale (exact DECIMAL coordinates)
+                  timestamp          int64 microseconds since 1970-01-01, as stored (UTC if timezone-aware)
+                  string             int32 offsets (rows + 1) into a UTF-8 string table
+                plus a uint8 validity array (1 = present) for columns that contain NULLs
+    directory   UTF-8 JSON: {"version": <content hash>, "tables": {table: {"rows": n, "columns":
+                {column: {"type", "offset", "validity", "scale", "data", "data_length"}}}}}
+
+A reader maps the file, parses the directory and views each column in place with no parsing or
+copying, e.g. numpy.frombuffer(mapping, "<i4", rows, offset); see WorldSnapshot. All tables are read
+in one transaction, so the snapshot is consistent. build() writes a temporary file and renames it
+over the old one, so readers holding the old mapping are never affected.
+
+    GET /snapshot/world                    the current file, with ETag / If-None-Match and Range
+
+Usage:
+    python world_snapshot.py [path]        # build once, e.g. from cron or a deploy hook
+"""
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import BigInteger, DateTime, Integer, Numeric, String, select
+
+import reference_bundle
+from db_routing import ReadSession
+from models import Colony, ColonyRat, PlagueRat, Player, Stats
+
+logger = logging.getLogger(__name__)
+
+WORLD_SNAPSHOT_PATH = os.getenv("WORLD_SNAPSHOT_PATH", "snapshots/world.bin")
+WORLD_SNAPSHOT_INTERVAL = float(os.getenv("WORLD_SNAPSHOT_INTERVAL", 0))  # seconds between rebuilds, 0 disables
+
+MAGIC = b"PRWS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sIQQQ")
+HEADER_SIZE = 64
+ALIGNMENT = 64
+
+MODELS = [Player, Colony, PlagueRat, ColonyRat, Stats, *reference_bundle.SECTIONS.values()]
+
+# Columns never written: the file is served without authentication.
+EXCLUDED_COLUMNS = {Player.__table__.c.email, Player.__table__.c.password_hash}
+
+EPOCH = datetime(1970, 1, 1)
+DTYPES = {"int32": "<i4", "int64": "<i8", "decimal": "<i8", "timestamp": "<i8"}
+
+_build_lock = threading.Lock()
+_versions = {}  # path -> (mtime, version) of the file last served
+
+
+def column_type(sql_type):
+    """Returns (snapshot type, scale) for a SQLAlchemy column type."""
+    if isinstance(sql_type, BigInteger):
+        return "int64", None
+    if isinstance(sql_type, Integer):
+        return "int32", None
+    if isinstance(sql_type, Numeric):
+        return "decimal", sql_type.scale or 0
+    if isinstance(sql_type, DateTime):
+        return "timestamp", None
+    if isinstance(sql_type, String):  # includes Text
+        return "string", None
+    raise TypeError(f"no snapshot type for {sql_type!r}")
+
+
+def _microseconds(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _encode(kind, scale, values):
+    """Returns (data, string table or None) for one column's non-NULL-filled values."""
+    if kind == "string":
+        encoded = [value.encode('utf-8') if value is not None else b"" for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype="<i4")
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return offsets.tobytes(), b"".join(encoded)
+    if kind == "decimal":
+        values = [int(value.scaleb(scale)) if value is not None else 0 for value in values]
+    elif kind == "timestamp":
+        values = [_microseconds(value) if value is not None else 0 for value in values]
+    else:
+        values = [value if value is not None else 0 for value in values]
+    return np.asarray(values, dtype=DTYPES[kind]).tobytes(), None
+
+
+class _Writer:
+    def __init__(self, file):
+        self.file = file
+        self.offset = HEADER_SIZE
+        file.write(b"\0" * HEADER_SIZE)
+
+    def add(self, data):
+        """Appends `data` at the next aligned offset and returns that offset."""
+        padding = -self.offset % ALIGNMENT
+        self.file.write(b"\0" * padding)
+        start = self.offset + padding
+        self.file.write(data)
+        self.offset = start + len(data)
+        return start
+
+
+def build(path=WORLD_SNAPSHOT_PATH):
+    """Writes a new snapshot to `path` and returns its directory."""
+    digest = hashlib.sha256()
+    tables = {}
+    temporary = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    session = ReadSession()
+    try:
+        with session.begin(), open(temporary, "wb") as file:
+            writer = _Writer(file)
+            for model in MODELS:
+                table = model.__table__
+                selected = [column for column in table.columns if column not in EXCLUDED_COLUMNS]
+                rows = session.execute(select(*selected).order_by(*table.primary_key.columns)).all()
+                columns = {}
+                for index, column in enumerate(selected):
+                    kind, scale = column_type(column.type)
+                    values = [row[index] for row in rows]
+                    data, strings = _encode(kind, scale, values)
+                    digest.update(data)
+                    entry = {"type": kind, "offset": writer.add(data)}
+                    if strings is not None:
+                        digest.update(strings)
+                        entry["data"] = writer.add(strings)
+                        entry["data_length"] = len(strings)
+                    if scale is not None:
+                        entry["scale"] = scale
+                    if any(value is None for value in values):
+                        entry["validity"] = writer.add(bytes(value is not None for value in values))
+                    columns[column.name] = entry
+                tables[table.name] = {"rows": len(rows), "columns": columns}
+
+            directory = {"version": digest.hexdigest()[:16], "tables": tables}
+            encoded = json.dumps(directory, separators=(",", ":")).encode('utf-8')
+            directory_offset = writer.add(encoded)
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, FORMAT_VERSION, int(time.time() * 1000), directory_offset, len(encoded)))
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    finally:
+        session.close()
+    logger.info(f"Built world snapshot {directory['version']} at {path} ({os.path.getsize(path)} bytes)")
+    return directory
+
+
+def ensure(path=WORLD_SNAPSHOT_PATH, max_age=None):
+    """Builds the snapshot unless a file younger than `max_age` seconds (any age if None) exists."""
+    with _build_lock:
+        if os.path.exists(path) and (max_age is None or time.time() - os.path.getmtime(path) < max_age):
+            return False
+        build(path)
+        return True
+
+
+def version(path=WORLD_SNAPSHOT_PATH):
+    """The content version of the snapshot at `path`, re-read only when the file has been replaced."""
+    mtime = os.path.getmtime(path)
+    cached = _versions.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _versions[path] = (mtime, WorldSnapshot(path).version)
+    return cached[1]
+
+
+class Strings:
+    """Read-only sequence view of a string column: offsets plus a string table, decoded on access."""
+
+    def __init__(self, offsets, data, validity):
+        self.offsets = offsets
+        self.data = data
+        self.validity = validity
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if self.validity is not None and not self.validity[index]:
+            return None
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+
+class WorldSnapshot:
+    """A mapped snapshot file. column() returns numpy views into the mapping, not copies."""
+
+    def __init__(self, path=WORLD_SNAPSHOT_PATH):
+        with open(path, "rb") as file:
+            self.mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.built_at, offset, length = HEADER.unpack_from(self.mapping, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} world snapshot")
+        directory = json.loads(self.mapping[offset:offset + length])
+        self.version = directory["version"]
+        self.tables = directory["tables"]
+
+    def rows(self, table):
+        return self.tables[table]["rows"]
+
+    def validity(self, table, column):
+        entry = self.tables[table]["columns"][column]
+        if "validity" not in entry:
+            return None
+        return np.frombuffer(self.mapping, dtype=np.uint8, count=self.rows(table), offset=entry["validity"])
+
+    def column(self, table, column):
+        """The column as a numpy array (int, scaled decimal or microsecond timestamp) or Strings."""
+        entry = self.tables[table]["columns"][column]
+        rows = self.rows(table)
+        if entry["type"] == "string":
+            offsets = np.frombuffer(self.mapping, dtype="<i4", count=rows + 1, offset=entry["offset"])
+            data = memoryview(self.mapping)[entry["data"]:entry["data"] + entry["data_length"]]
+            return Strings(offsets, data, self.validity(table, column))
+        return np.frombuffer(self.mapping, dtype=DTYPES[entry["type"]], count=rows, offset=entry["offset"])
+
+
+class SnapshotRefresher(threading.Thread):
+    """Daemon thread rebuilding the snapshot every `interval` seconds."""
+
+    def __init__(self, interval, path=WORLD_SNAPSHOT_PATH):
+        super().__init__(name="world-snapshot", daemon=True)
+        self.interval = interval
+        self.path = path
+        self._stopped = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                # Other processes on the host share the file; a fresh one means someone else just built it.
+                ensure(self.path, max_age=self.interval / 2)
+            except Exception as e:
+                logger.error(f"Error building the world snapshot: {e}")
+            if self._stopped.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stopped.set()
+
+
+def start_refresher():
+    """Starts the refresher if WORLD_SNAPSHOT_INTERVAL is set."""
+    if WORLD_SNAPSHOT_INTERVAL <= 0:
+        return None
+    refresher = SnapshotRefresher(WORLD_SNAPSHOT_INTERVAL)
+    refresher.start()
+    return refresher
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    directory = build(sys.argv[1] if len(sys.argv) > 1 else WORLD_SNAPSHOT_PATH)
+    print(f"version {directory['version']}: " + ", ".join(f"{table} {info['rows']}"
+                                                         for table, info in directory["tables"].items()))